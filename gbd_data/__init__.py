@@ -0,0 +1 @@
+"""Data loading shared by the Streamlit pages."""
@@ -0,0 +1,80 @@
+"""
+Named datasets shared by all Streamlit pages.
+
+Each dataset is read once per server process with ``st.cache_resource``
+and every page and rerun gets the same frame back, instead of each page
+reading (and ``st.cache_data`` copying) its own. The frames are shared, so
+their arrays are made read-only: derive new frames from them, never modify
+them in place.
+
+Datasets come from the Parquet store built by ``python -m gbd_data.store``.
+One that is not in the store, or whose raw file changed after the build,
+is parsed from the raw file instead (see ``sources``). Either way every
+frame has the column types of ``schema``. Pages that need only part of a
+dataset should ``query`` for it rather than filter a ``load``.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from gbd_data import schema, sources, store
+
+
+def read_only(frame):
+    """``frame`` rebuilt on arrays that cannot be written in place."""
+    columns = {}
+    for name, series in frame.items():
+        values = series.to_numpy() if isinstance(series.dtype, np.dtype) else series.array
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+        columns[name] = values
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+@st.cache_resource(show_spinner=False)
+def load(name):
+    """The dataset ``name`` (a key of ``sources.DATASETS``) in the canonical schema."""
+    frame = store.read(name)
+    if frame is None:
+        frame = sources.read_source(name)
+    return read_only(schema.apply(frame))
+
+
+@st.cache_resource(show_spinner=False)
+def load_named(name):
+    """Like ``load``, with ``location_name`` and ``cause_name`` joined on."""
+    frame = load(name).merge(load("location_mapping"), on="location_id", how="left")
+    return read_only(frame.merge(load("cause_mapping"), on="cause_id", how="left"))
+
+
+def _matches(frame, filters):
+    keep = np.ones(len(frame), dtype=bool)
+    for column, op, value in filters:
+        values = frame[column]
+        if op == "==":
+            match = values == value
+        elif op == "in":
+            match = values.isin(value)
+        elif op == ">=":
+            match = values >= value
+        else:
+            match = values <= value
+        keep &= match.to_numpy()
+    return keep
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def query(name, columns=None, metric=None, sex_ids=None, years=None, cause_ids=None, location_ids=None):
+    """The rows of ``name`` matching the filters, with only ``columns``.
+
+    The filters are those of ``store.row_filters``. Read from the store,
+    only the partitions, row groups and columns they need are decoded;
+    otherwise the whole dataset is loaded and filtered in memory.
+    """
+    filters = store.row_filters(metric, sex_ids, years, cause_ids, location_ids)
+    frame = store.read(name, columns, filters)
+    if frame is None:
+        frame = load(name)
+        frame = frame.loc[_matches(frame, filters), list(columns or frame.columns)].reset_index(drop=True)
+    return read_only(schema.apply(frame))
@@ -0,0 +1,67 @@
+"""
+Column types every loader goes through, for the Streamlit pages and the
+Flask app alike: small integers for ids and years, float32 for values and
+categoricals for the names that repeat on every row.
+
+Types are keyed on the canonical column names (see ``sources``); columns
+not listed here are left alone. Categorical names change two things for
+callers: ``groupby``/``pivot_table`` on them need ``observed=True`` to skip
+combinations that never occur, and they must be ``astype(str)`` before
+string concatenation.
+"""
+
+import numpy as np
+import pandas as pd
+
+ID_TYPES = {
+    "location_id": "int16",
+    "cause_id": "int16",
+    "sex_id": "int8",
+    "metric_id": "int8",
+    "measure_id": "int8",
+    "age_group_id": "int16",
+    "year": "int16",
+}
+VALUE_TYPES = {"val": "float32", "upper": "float32", "lower": "float32", "death_rate": "float32"}
+NAME_COLUMNS = ("location_name", "cause_name", "metric_name", "measure_name", "sex", "sex_label", "age_group_name")
+
+DTYPES = {**ID_TYPES, **VALUE_TYPES, **{name: "category" for name in NAME_COLUMNS}}
+
+
+def read_dtypes(columns):
+    """``dtype`` argument for ``pd.read_csv`` over ``columns``.
+
+    Integer columns are left to ``apply``, which checks their range first.
+    """
+    return {c: DTYPES[c] for c in columns if c in DTYPES and c not in ID_TYPES}
+
+
+def _integer(column, dtype):
+    if column.isna().any() or not (pd.api.types.is_integer_dtype(column.dtype) or pd.api.types.is_float_dtype(column.dtype)):
+        return column
+    if len(column):
+        info = np.iinfo(dtype)
+        if column.min() < info.min or column.max() > info.max:
+            return pd.to_numeric(column, downcast="integer")
+    return column.astype(dtype)
+
+
+def apply(frame):
+    """``frame`` with every column listed in ``DTYPES`` converted to its type.
+
+    Ids that do not fit their type keep the smallest one that holds them,
+    and integer columns with missing values are not converted.
+    """
+    converted = {}
+    for name in frame.columns.intersection(list(DTYPES)):
+        column, dtype = frame[name], DTYPES[name]
+        if str(column.dtype) == dtype:
+            continue
+        if name in ID_TYPES:
+            column = _integer(column, dtype)
+        else:
+            column = column.astype(dtype)
+        converted[name] = column
+    if not converted:
+        return frame
+    return pd.DataFrame({name: converted.get(name, frame[name]) for name in frame.columns}, index=frame.index, copy=False)
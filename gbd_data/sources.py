@@ -0,0 +1,99 @@
+"""
+The raw input files behind each named dataset, and how each is brought
+into the canonical schema: ``location_id``, ``location_name``,
+``cause_id``, ``cause_name``, ``sex_id``, ``year`` and ``val`` mean the
+same thing in every dataset.
+"""
+
+import os
+
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages")
+
+GBD_COLUMNS = ["location_id", "cause_id", "sex_id", "year", "metric_name", "val"]
+METRIC_NAMES = {1: "Number", 2: "Percent", 3: "Rate"}
+WORLD_BANK_COLUMNS = {"Country Name": "location_name"}
+
+
+def _gbd(frame):
+    if "metric_name" not in frame and "metric_id" in frame:
+        frame = frame.assign(metric_name=frame["metric_id"].map(METRIC_NAMES))
+    return frame[GBD_COLUMNS]
+
+
+def _columns(*columns):
+    return lambda frame: frame[list(columns)]
+
+
+def _world_bank(frame):
+    frame = frame.rename(columns=WORLD_BANK_COLUMNS)
+    return frame.drop(columns=[c for c in frame.columns if str(c).startswith("Unnamed:")])
+
+
+def _life_expectancy(frame):
+    return frame.rename(columns={"Entity": "location_name"})
+
+
+def _codebook(frame):
+    frame = frame.copy()
+    frame.columns = frame.columns.str.replace(r"^Variable:\s*", "", regex=True).str.strip()
+    return frame
+
+
+def _age_mortality(frame):
+    return frame.assign(
+        year=pd.to_numeric(frame["year"], errors="coerce").astype(int),
+        val=pd.to_numeric(frame["val"], errors="coerce"),
+    )
+
+
+def _death_rates(frame):
+    return frame.assign(sex=frame["sex"].str.lower())
+
+
+def _identity(frame):
+    return frame
+
+
+# name -> (candidate files in order of preference, reader options, normalizer)
+DATASETS = {
+    "gbd": (("GBD.parquet", "GBD.csv"), {}, _gbd),
+    "filtered_data": (("filtered_data.parquet",), {}, _identity),
+    "infant_mortality": (("infant_mortality_data.parquet",), {}, _identity),
+    "cause_mapping": (("cause_mapping.parquet", "cause_mapping.csv"), {}, _columns("cause_id", "cause_name")),
+    "location_mapping": (("location_mapping.parquet", "location_mapping.csv"), {}, _columns("location_id", "location_name")),
+    "location_codes": (("locations_with_codes.csv",), {}, _columns("location_id", "country_code")),
+    "cause_hierarchy": (("IHME_GBD_2021_HIERARCHIES_Y2024M05D16.XLSX",), {"sheet_name": "Cause Hierarchy"}, _identity),
+    "income_classification": (("country_classification_by_income.xlsx",), {"sheet_name": "Country Analytical History", "header": 5, "dtype": str}, _identity),
+    "codebook": (("IHME_GBD_2021_CODEBOOK_Y2024M05D16.CSV",), {"header": 0, "skiprows": [1]}, _codebook),
+    "age_mortality": (("age_moratility_data_95percentile.csv",), {}, _age_mortality),
+    "death_rates_by_sex": (("data_2.csv",), {}, _death_rates),
+    "aggregated_by_year_location": (("aggregated_by_year_location.parquet",), {}, _identity),
+    "gdp": (("gdp_processed.parquet",), {}, _world_bank),
+    "population": (("world_population.parquet",), {}, _world_bank),
+    "health_expenditure": (("health_exp.parquet",), {}, _world_bank),
+    "life_expectancy": (("life_expectancy.parquet",), {}, _life_expectancy),
+}
+
+
+def source_path(name, data_dir=DATA_DIR):
+    """The file ``name`` is read from: the first of its candidates that exists."""
+    files, _, _ = DATASETS[name]
+    paths = [os.path.join(data_dir, f) for f in files]
+    return next((p for p in paths if os.path.exists(p)), paths[-1])
+
+
+def _read(path, **options):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return pd.read_parquet(path, **options)
+    if extension in (".xlsx", ".xls"):
+        return pd.read_excel(path, **options)
+    return pd.read_csv(path, **options)
+
+
+def read_source(name, data_dir=DATA_DIR):
+    """Parse the raw file behind ``name`` into the canonical schema."""
+    _, options, normalize = DATASETS[name]
+    return normalize(_read(source_path(name, data_dir), **options))
@@ -0,0 +1,91 @@
+"""
+Optional DuckDB backend for the filter-aggregate queries the pages run on
+every widget change.
+
+With the ``duckdb`` package installed, ``query`` runs SQL in-process on all
+cores straight over the Parquet store (only the year partitions, row
+groups and columns a query needs are read) or over frames already in
+memory, and returns an Arrow-backed frame. Without it, or when a dataset
+is not in the store, ``query`` returns None and pages fall back to pandas.
+"""
+
+import threading
+
+import pandas as pd
+
+from gbd_data import store
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# numpy type of a year partition -> DuckDB type
+HIVE_TYPES = {"int8": "TINYINT", "int16": "SMALLINT", "int32": "INTEGER", "int64": "BIGINT"}
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def available():
+    return duckdb is not None
+
+
+def _cursor():
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = duckdb.connect()
+        # One cursor per query: a cursor is its own connection to the same
+        # database, so concurrent sessions and their temp views do not mix.
+        return _connection.cursor()
+
+
+def _quote(path):
+    return "'" + path.replace("'", "''") + "'"
+
+
+def relation(name):
+    """SQL reading the store dataset ``name``, or None if it is not there
+    or is partitioned on a column type DuckDB is not told about here."""
+    located = store.locate(name)
+    if located is None:
+        return None
+    path, entry = located
+    if entry["partition"] is None:
+        return f"read_parquet({_quote(path + '.parquet')})"
+    hive_type = HIVE_TYPES.get(entry["partition"])
+    if hive_type is None:
+        return None
+    return f"read_parquet({_quote(path + '/*/*.parquet')}, hive_partitioning = true, hive_types = {{'{store.PARTITION_COLUMN}': {hive_type}}})"
+
+
+def query(text, params=None, **tables):
+    """Run ``text`` with named ``$params`` and return an Arrow-backed frame.
+
+    Each keyword names a table the SQL can use: a string is the name of a
+    store dataset, a frame is scanned in place. Returns None when DuckDB is
+    not installed or a dataset cannot be read from the store (see
+    ``relation``).
+    """
+    if duckdb is None:
+        return None
+    views = {}
+    for alias, table in tables.items():
+        if isinstance(table, str):
+            views[alias] = relation(table)
+            if views[alias] is None:
+                return None
+    cursor = _cursor()
+    try:
+        for alias, table in tables.items():
+            if alias in views:
+                cursor.execute(f"CREATE TEMP VIEW {alias} AS SELECT * FROM {views[alias]}")
+            else:
+                cursor.register(alias, table)
+        result = cursor.execute(text, params or {}).arrow()
+        # Older DuckDB returns a Table here, newer ones a RecordBatchReader.
+        table = result.read_all() if hasattr(result, "read_all") else result
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    finally:
+        cursor.close()
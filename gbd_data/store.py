@@ -0,0 +1,246 @@
+"""
+Offline build of the Parquet store the Streamlit pages load from:
+    python -m gbd_data.store [--data-dir pages] [--store-dir pages/store]
+
+Every dataset in ``sources.DATASETS`` whose raw file is present is parsed
+once, brought to the column types of ``schema`` (other integers narrowed
+to the smallest type that holds them, other floats stored as float32) and
+written under ``<store-dir>/<version>/``.
+Tables with a ``year`` column get one ``year=YYYY`` directory per year,
+sorted by cause (then location and sex) inside it, so readers can skip
+whole years by directory and causes by row-group statistics. Strings are
+dictionary-encoded in the files, and categorical names are read back as
+categoricals without decoding them to strings.
+
+``current.json`` names the current version and records, for every dataset,
+the fingerprint of the file it was built from and the sha256 of every file
+written. The version is derived from the source hashes, so rebuilding
+unchanged inputs is a no-op.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from gbd_data import schema, sources
+
+STORE_FORMAT = 2
+STORE_DIR = os.path.join(sources.DATA_DIR, "store")
+MANIFEST_NAME = "current.json"
+PARTITION_COLUMN = "year"
+SORT_COLUMNS = ("cause_id", "cause", "cause_name", "location_id", "location", "location_name", "sex_id", "sex", "age")
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"source": os.path.basename(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+
+
+def store_version(fingerprints):
+    digest = hashlib.sha256(str(STORE_FORMAT).encode())
+    for name in sorted(fingerprints):
+        digest.update(f"{name}:{fingerprints[name]['sha256']}".encode())
+    return digest.hexdigest()[:16]
+
+
+def read_manifest(directory=STORE_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, obj):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def compact(frame):
+    """Copy of ``frame`` with narrowed numeric types and string column names.
+
+    Object columns holding more than one type (as spreadsheets often do)
+    are turned into strings, which Parquet needs.
+    """
+    columns = {}
+    for name, column in frame.items():
+        if pd.api.types.is_integer_dtype(column.dtype):
+            column = pd.to_numeric(column, downcast="integer")
+        elif pd.api.types.is_float_dtype(column.dtype):
+            column = column.astype("float32")
+        elif column.dtype == object and pd.api.types.infer_dtype(column, skipna=True).startswith("mixed"):
+            column = column.where(column.isna(), column.astype(str))
+        columns[str(name)] = column
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def _write_table(frame, path):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE, use_dictionary=True, compression="zstd")
+
+
+def write_dataset(frame, path):
+    """Write ``frame`` to ``path``.parquet, or partitioned by year into the
+    directory ``path``. Returns the partition column type, or None."""
+    if PARTITION_COLUMN not in frame:
+        _write_table(frame, f"{path}.parquet")
+        return None
+    keys = [PARTITION_COLUMN] + [c for c in SORT_COLUMNS if c in frame]
+    frame = frame.sort_values(keys, kind="stable")
+    for year, part in frame.groupby(PARTITION_COLUMN, sort=True):
+        part_dir = os.path.join(path, f"{PARTITION_COLUMN}={year}")
+        os.makedirs(part_dir)
+        _write_table(part.drop(columns=PARTITION_COLUMN), os.path.join(part_dir, "part-0.parquet"))
+    return str(frame[PARTITION_COLUMN].dtype)
+
+
+def _file_hashes(version_dir, name):
+    path = os.path.join(version_dir, name)
+    if os.path.isdir(path):
+        files = [os.path.join(d, f) for d, _, names in os.walk(path) for f in names]
+    else:
+        files = [f"{path}.parquet"]
+    return {os.path.relpath(f, version_dir).replace(os.sep, "/"): file_sha256(f) for f in sorted(files)}
+
+
+def build(data_dir=sources.DATA_DIR, directory=STORE_DIR, force=False, log=print):
+    """Build the store from the raw files in ``data_dir``; returns its version."""
+    paths = {name: sources.source_path(name, data_dir) for name in sources.DATASETS}
+    paths = {name: path for name, path in paths.items() if os.path.exists(path)}
+    fingerprints = {name: _fingerprint(path) for name, path in paths.items()}
+    version = store_version(fingerprints)
+    previous = read_manifest(directory)
+    if not force and previous and previous.get("format") == STORE_FORMAT and previous["version"] == version:
+        log(f"Store {version} is up to date")
+        return version
+    version_dir = os.path.join(directory, version)
+    tmp_dir = f"{version_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    datasets = {}
+    for name, path in paths.items():
+        frame = schema.apply(compact(sources.read_source(name, data_dir)))
+        partition = write_dataset(frame, os.path.join(tmp_dir, name))
+        datasets[name] = {**fingerprints[name], "rows": len(frame), "columns": list(frame.columns), "partition": partition, "files": _file_hashes(tmp_dir, name)}
+        log(f"{name}: {len(frame)} rows from {os.path.basename(path)}")
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+    _write_json(os.path.join(directory, MANIFEST_NAME), {"format": STORE_FORMAT, "version": version, "datasets": datasets})
+    # The previous version stays until the next build, for processes that
+    # still read from it.
+    keep = {version, previous and previous.get("version")}
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry not in keep and ".tmp" not in entry and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    log(f"Store {version} written to {version_dir}")
+    return version
+
+
+def _source_unchanged(name, entry, data_dir):
+    path = sources.source_path(name, data_dir)
+    if not os.path.exists(path):
+        return True
+    if os.path.basename(path) != entry["source"]:
+        return False
+    stat = os.stat(path)
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    return file_sha256(path) == entry["sha256"]
+
+
+def locate(name, directory=STORE_DIR, data_dir=sources.DATA_DIR):
+    """``(path, manifest entry)`` of ``name`` in the store, or None when the
+    store has no such dataset or its raw file changed since the build. The
+    path is a directory of year partitions, or a file without ``.parquet``
+    when the entry has no partition."""
+    manifest = read_manifest(directory)
+    if not manifest or manifest.get("format") != STORE_FORMAT:
+        return None
+    entry = manifest["datasets"].get(name)
+    if entry is None or not _source_unchanged(name, entry, data_dir):
+        return None
+    return os.path.join(directory, manifest["version"], name), entry
+
+
+def open_dataset(name, directory=STORE_DIR, data_dir=sources.DATA_DIR):
+    """``(pyarrow dataset, manifest entry)`` for ``name``, or None (see ``locate``)."""
+    located = locate(name, directory, data_dir)
+    if located is None:
+        return None
+    path, entry = located
+    if entry["partition"] is None:
+        return ds.dataset(f"{path}.parquet", format="parquet"), entry
+    partition_schema = pa.schema([(PARTITION_COLUMN, pa.from_numpy_dtype(np.dtype(entry["partition"])))])
+    return ds.dataset(path, format="parquet", partitioning=ds.partitioning(partition_schema, flavor="hive")), entry
+
+
+def row_filters(metric=None, sex_ids=None, years=None, cause_ids=None, location_ids=None):
+    """Row predicates as ``(column, op, value)`` triples, the form pyarrow's
+    ``filters`` take. ``metric`` is a ``metric_name``, ``years`` an inclusive
+    ``(first, last)`` range with either end optional, and the others
+    collections of ids. ``None`` leaves a column unfiltered."""
+    filters = []
+    if metric is not None:
+        filters.append(("metric_name", "==", metric))
+    for column, ids in (("sex_id", sex_ids), ("cause_id", cause_ids), ("location_id", location_ids)):
+        if ids is not None:
+            filters.append((column, "in", list(ids)))
+    if years is not None:
+        first, last = years
+        if first is not None:
+            filters.append(("year", ">=", first))
+        if last is not None:
+            filters.append(("year", "<=", last))
+    return filters
+
+
+def read(name, columns=None, filters=None, directory=STORE_DIR, data_dir=sources.DATA_DIR):
+    """The dataset ``name`` from the store, or None (see ``open_dataset``).
+
+    Only ``columns`` (default: all) are returned and only rows matching
+    every one of ``filters`` (see ``row_filters``). Both are pushed into the
+    scan: year partitions and row groups whose statistics rule them out are
+    skipped, and columns that are neither returned nor filtered on are not
+    decoded.
+    """
+    opened = open_dataset(name, directory, data_dir)
+    if opened is None:
+        return None
+    dataset, entry = opened
+    expression = pq.filters_to_expression(filters) if filters else None
+    table = dataset.to_table(columns=list(columns or entry["columns"]), filter=expression)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=sources.DATA_DIR, help="directory with the raw files (default: %(default)s)")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="directory of the store (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the sources did not change")
+    args = parser.parse_args()
+    os.makedirs(args.store_dir, exist_ok=True)
+    build(args.data_dir, args.store_dir, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ from plotly.colors import qualitative
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+
+from gbd_data import catalog, sql
+
 st.set_page_config(page_title="Death-Rate Trends Across Age-Groups Dashboard", layout="wide", initial_sidebar_state="expanded")
 
 # Inject custom CSS styling
@@ -43,21 +46,15 @@ def generate_line_charts(df_pivot, current_year):
     return fig
 
 
-# Cache the data loading function
-@st.cache_data(show_spinner=False)
-def load_data(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+def load_data() -> pd.DataFrame:
+    df = catalog.load("age_mortality")
     if 'All causes' in df['cause'].unique():
         df = df[df['cause'] != 'All causes']
-    df['year'] = pd.to_numeric(df['year'], errors='coerce').astype(int)
-    for col in ['val']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
     return df
 
 # Load mappings from codebook
-def load_mappings(codebook_path: str) -> dict:
-    codebook = pd.read_csv(codebook_path, header=0, skiprows=[1])
-    codebook.columns = codebook.columns.str.replace(r"^Variable:\s*", "", regex=True).str.strip()
+def load_mappings() -> dict:
+    codebook = catalog.load("codebook")
     return {
         "measure": dict(codebook[["measure_id", "measure_name"]].drop_duplicates().values),
         "location": dict(codebook[["location_id", "location_name"]].drop_duplicates().values),
@@ -66,6 +63,12 @@ def load_mappings(codebook_path: str) -> dict:
         "cause": dict(codebook[["cause_id", "cause_name"]].drop_duplicates().values)
     }
 
+# Shared by every session, so it is mapped once rather than on every rerun
+@st.cache_resource(show_spinner=False)
+def load_mapped_data() -> pd.DataFrame:
+    df = apply_mapping(load_data(), load_mappings(), ['location', 'sex', 'age', 'cause'])
+    return catalog.read_only(df)
+
 # Sidebar filter controls
 def get_sidebar_filters(df: pd.DataFrame):
     st.sidebar.header("Filter data")
@@ -91,10 +94,30 @@ def get_sidebar_filters(df: pd.DataFrame):
     year_range = st.sidebar.slider("Year range", year_min, year_max, (year_min, year_max), step=1)
     return tuple(locs), tuple(causes), tuple(sexes), year_range, tuple(comp_countries)
 
-# Cache filtered data
+FILTER_SQL = """
+SELECT * FROM age_data
+WHERE ($all_locations OR list_contains($locations, location))
+  AND list_contains($causes, cause)
+  AND list_contains($sexes, sex)
+  AND year BETWEEN $first_year AND $last_year
+"""
+
+# Cache filtered data; the frame is always the shared mapped one, so it is
+# left out of the cache key rather than hashed on every rerun
 @st.cache_data(show_spinner=False)
-def filter_data(locations: tuple, causes: tuple, sexes: tuple, year_range: tuple, df_ref: pd.DataFrame) -> pd.DataFrame:
-    df = df_ref.copy()
+def filter_data(locations: tuple, causes: tuple, sexes: tuple, year_range: tuple, _df_ref: pd.DataFrame) -> pd.DataFrame:
+    params = {
+        "all_locations": 'Global' in locations,
+        "locations": list(locations),
+        "causes": list(causes),
+        "sexes": list(sexes),
+        "first_year": int(year_range[0]),
+        "last_year": int(year_range[1]),
+    }
+    df = sql.query(FILTER_SQL, params, age_data=_df_ref)
+    if df is not None:
+        return df
+    df = _df_ref.copy()
     if 'Global' not in locations:
         df = df[df['location'].isin(locations)]
     df = df[df['cause'].isin(causes) & df['sex'].isin(sexes) & df['year'].between(year_range[0], year_range[1])]
@@ -307,9 +330,7 @@ def filter_age_bracket_data(df, locations, sexes, causes):
 
 def main():
     st.title("\U0001F9EC Death Rate Trends Across Age-Groups Dashboard")
-    mappings = load_mappings("pages\\IHME_GBD_2021_CODEBOOK_Y2024M05D16.CSV")
-    df = load_data("pages\\age_moratility_data_95percentile.csv")
-    df = apply_mapping(df, mappings, ['location', 'sex', 'age', 'cause'])
+    df = load_mapped_data()
     locs, causes, sexes, year_range, comp_countries = get_sidebar_filters(df)
     df_f = filter_data(locs, causes, sexes, year_range, df)
     st.markdown(f"**Filtered records:** {len(df_f)}")
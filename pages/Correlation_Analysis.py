@@ -2,22 +2,12 @@ import pandas as pd
 import pycountry
 import os
 
-gbd_path = f"pages\\GBD.parquet"
-location_mapping = f"pages\\location_mapping.parquet"
-cause_mapping = f"pages\\cause_mapping.parquet"
-# gdp_path = f"{dataset_path}GDP.parquet"
-gdp_path = f"pages\\gdp_processed.parquet"
-pop_path = f"pages\\world_population.parquet"
-health_exp_path = f"pages\\health_exp.parquet"
-life_expectancy = f"pages\\life_expectancy.parquet"
+from gbd_data import catalog
 
 
 
 ## Load Main Dataset 
-df_main = pd.read_parquet(gbd_path)
-
-df_rate = df_main[df_main["metric_name"] == "Rate"]
-df_rate = df_rate.drop(columns=['metric_name'])
+df_rate = catalog.query("gbd", columns=("location_id", "year", "val"), metric="Rate")
 df_rate = df_rate.rename(columns={"val": "mortality_rate"})
 df_rate = df_rate.groupby(['location_id', 'year'])['mortality_rate'].sum().reset_index()
 
@@ -26,7 +16,7 @@ df_rate.columns = df_rate.columns.astype(str)
 df_rate.columns.name = None
 df_rate.reset_index(inplace=True)
 
-df_loc = pd.read_parquet(location_mapping)
+df_loc = catalog.load("location_mapping")
 df_rate = pd.merge(df_rate, df_loc, on='location_id', how='left')
 cols = ['location_name'] + [col for col in df_rate if col != 'location_name']
 df_rate = df_rate[cols]
@@ -38,18 +28,18 @@ df_rate.drop(columns=[col for col in years_to_drop if col in df_rate.columns], i
 
 
 ## Load GDP Dataset
-df_gdp = pd.read_parquet(gdp_path)
+df_gdp = catalog.load("gdp")
 years_to_drop = [str(year) for year in range(1960, 2000)]
 years_to_drop.append("2022")
 years_to_drop.append("2023")
 years_to_drop.append("2024")
 years_to_drop.append("Unnamed: 69")
 
-df_gdp.drop(columns=[col for col in years_to_drop if col in df_gdp.columns], inplace=True)
+df_gdp = df_gdp.drop(columns=[col for col in years_to_drop if col in df_gdp.columns])
 df_gdp = df_gdp.rename(columns={"Country Name":"location_name" })
 
-df_pop = pd.read_parquet(pop_path)
-df_pop.drop(columns=['Country Code', 'Indicator Name', 'Indicator Code'], inplace=True)
+df_pop = catalog.load("population")
+df_pop = df_pop.drop(columns=['Country Code', 'Indicator Name', 'Indicator Code'])
 df_pop = df_pop.rename(columns={"Country Name": "location_name"})
 years_to_drop = [str(year) for year in range(1960, 2000)]
 years_to_drop.append("2022")
@@ -61,8 +51,8 @@ df_pop.drop(columns=[col for col in years_to_drop if col in df_pop.columns], inp
 
 
 ## Load Health EXP
-df_health_exp = pd.read_parquet(health_exp_path)
-df_health_exp.drop(columns=['Country Code', 'Indicator Name', 'Indicator Code'], inplace=True)
+df_health_exp = catalog.load("health_expenditure")
+df_health_exp = df_health_exp.drop(columns=['Country Code', 'Indicator Name', 'Indicator Code'])
 df_health_exp = df_health_exp.rename(columns={"Country Name": "location_name"})
 years_to_drop = [str(year) for year in range(1960, 2000)]
 years_to_drop.append("2022")
@@ -74,10 +64,10 @@ df_health_exp.drop(columns=[col for col in years_to_drop if col in df_health_exp
 
 ## Load Life Exp Dataset
 
-df_life_expectancy = pd.read_parquet(life_expectancy)
+df_life_expectancy = catalog.load("life_expectancy")
 df_life_expectancy = df_life_expectancy.rename(columns={"Entity": "location_name", "Period life expectancy at birth - Sex: total - Age: 0": "EXP"})
 df_life_expectancy.drop(columns=['Code',], inplace=True)
-df_life_expectency = df_life_expectancy.groupby(['location_name', 'Year'])['EXP'].sum().reset_index()
+df_life_expectency = df_life_expectancy.groupby(['location_name', 'Year'], observed=True)['EXP'].sum().reset_index()
 df_life_expectancy = df_life_expectancy.pivot(index='location_name', columns='Year', values='EXP')
 df_life_expectancy.columns = df_life_expectancy.columns.astype(str)
 df_life_expectancy.columns.name = None
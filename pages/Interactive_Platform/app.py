@@ -1,10 +1,49 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
+from werkzeug.local import LocalProxy
 import pandas as pd
 import json
 import numpy as np
+from rate_cube import RateCube
+from hierarchy import CauseHierarchy
+from response_cache import ResponseCache
+import snapshot
+import rate_blocks
+import sys
+import contextvars
+import functools
+import hmac
+import os
+import threading
+import time
+from compression import PrecompressedBody, IMMUTABLE, compress_response
+from warm_up import WarmUp
+from world_map import build_world_map
+
+# Column types are shared with the Streamlit pages, see gbd_data/ at the
+# repository root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from gbd_data import schema
 
 app = Flask(__name__)
 EXCLUDED_DISEASE_IDS = {1058, 1029, 1026, 1027, 1028, 1059, 294}
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+HIERARCHY_PATH = 'data/filtered_hierarchical_causes.json'
+LOCATION_MAPPING_PATH = '../location_mapping.csv'
+GBD_PATH = '../GBD.csv'
+SOURCE_PATHS = [HIERARCHY_PATH, LOCATION_MAPPING_PATH, GBD_PATH]
+SNAPSHOT_DIR = 'data/snapshot'
+WORLD_MAP_PATH = 'data/countries-110m.geojson'
+BATCH_MAX_QUERIES = 32
+DEFAULT_SEX_IDS = (1, 2)
+TRAJECTORY_CACHE_SIZE = 64
+ADMIN_TOKEN = os.environ.get('INTERACTIVE_PLATFORM_ADMIN_TOKEN')
+RELOAD_POLL_SECONDS = float(os.environ.get('INTERACTIVE_PLATFORM_RELOAD_POLL_SECONDS', 0))
+app.config.update(
+    COMPRESS_LEVEL=int(os.environ.get('INTERACTIVE_PLATFORM_COMPRESS_LEVEL', 6)),
+    COMPRESS_BROTLI_QUALITY=int(os.environ.get('INTERACTIVE_PLATFORM_BROTLI_QUALITY', 5)),
+    COMPRESS_MIN_SIZE=1024,
+)
 def filter_disease_hierarchy(causes):
     filtered_causes = []
     for cause in causes:
@@ -14,13 +53,13 @@ def filter_disease_hierarchy(causes):
             filtered_causes.append(cause)
     return filtered_causes
 
-def load_data():
-    with open('data/filtered_hierarchical_causes.json', 'r') as f:
+def load_data_from_sources():
+    with open(HIERARCHY_PATH, 'r') as f:
         disease_hierarchy = json.load(f)
     
     disease_hierarchy['causes'] = filter_disease_hierarchy(disease_hierarchy['causes'])
-    location_mapping = pd.read_csv('../location_mapping.csv')
-    location_dict = dict(zip(location_mapping['location_id'], location_mapping['location_name']))
+    location_mapping = pd.read_csv(LOCATION_MAPPING_PATH)
+    location_dict = dict(zip(location_mapping['location_id'].astype(int), location_mapping['location_name']))
     location_dict[169]="Central African Rep."
     location_dict[12]="Laos"
     location_dict[20]="Vietnam"
@@ -30,137 +69,233 @@ def load_data():
     location_dict[28]="Solomon Is."
     location_dict[44]="Bosnia and Herz."
     
-    gbd_data = pd.read_csv('../GBD.csv',usecols=['location_id', 'cause_id', 'sex_id', 'year', 'metric_name', 'val'])
+    columns = ['location_id', 'cause_id', 'sex_id', 'year', 'metric_name', 'val']
+    gbd_data = schema.apply(pd.read_csv(GBD_PATH, usecols=columns, dtype=schema.read_dtypes(columns)))
     gbd_data = gbd_data[~gbd_data['cause_id'].isin(EXCLUDED_DISEASE_IDS)]
     rate_data = gbd_data[gbd_data['metric_name'] == 'Rate']
-    available_years = sorted(rate_data['year'].unique())
-    available_years = [int(year) for year in available_years]
-    return disease_hierarchy, location_dict, rate_data, available_years
-
-disease_hierarchy, location_dict, rate_data, available_years = load_data()
-
-class TreeNode:
-    def __init__(self, disease_id, disease_name, parent_id=None):
-        self.disease_id = disease_id
-        self.disease_name = disease_name
-        self.parent_id = parent_id
-        self.value = 0
-        self.taken = False
-        self.children = []
-        self.parent = None
-
-    def add_child(self, child_node):
-        self.children.append(child_node)
-        child_node.parent = self
-
-    def __repr__(self):
-        return f"TreeNode(id={self.disease_id}, name={self.disease_name})"
-class DiseaseTree:
-    def __init__(self):
-        self.nodes = {}
-        self.root_nodes = []
-
-    def build_from_json(self, cause_list, parent_id=None):
-        for cause in cause_list:
-            node = TreeNode(disease_id=cause["id"], disease_name=cause["name"], parent_id=parent_id)
-            self.nodes[node.disease_id] = node
-            if parent_id is not None:
-                parent_node = self.nodes[parent_id]
-                parent_node.add_child(node)
-            else:
-                self.root_nodes.append(node)
-            if "subcauses" in cause:
-                self.build_from_json(cause["subcauses"], parent_id=node.disease_id)
-
-    def reset_all_values(self):
-        new_set = {}
-        for id, node in self.nodes.items():
-            node.value = 0
-            node.taken = False
-            new_set[id]=node
-        self.nodes=new_set
-    def get_node(self, disease_id):
-        return self.nodes.get(disease_id)
-    
-    def update_value(self, disease_id, value, taken=None):
-        node = self.get_node(disease_id)
-        node.value=value
-        if taken!=None:
-            node.taken=taken
-        self.nodes[disease_id] = node
+    rate_cube = RateCube.from_frame(rate_data)
+    leaf_prefix = rate_cube.leaf_prefix_sums(CauseHierarchy(disease_hierarchy['causes']))
+    return disease_hierarchy, location_dict, rate_cube, leaf_prefix
 
-    def __repr__(self):
-        return f"DiseaseTree({len(self.nodes)} nodes)"
-
-dtree = DiseaseTree()
-dtree.build_from_json(disease_hierarchy["causes"])
+def load_data():
+    # The snapshot is rebuilt from the CSV whenever the content hash of any
+    # source file no longer matches the one it was built from.
+    loaded = snapshot.load(SNAPSHOT_DIR, SOURCE_PATHS)
+    if loaded is None:
+        snapshot.save(SNAPSHOT_DIR, SOURCE_PATHS, *load_data_from_sources())
+        # Read the fresh snapshot back so the cube and its prefix sums are
+        # file-backed and can be shared between forked workers (see serve.py).
+        loaded = snapshot.load(SNAPSHOT_DIR, SOURCE_PATHS)
+    if loaded is None:
+        raise RuntimeError(f"Could not read back the snapshot in {SNAPSHOT_DIR}")
+    disease_hierarchy, location_dict, rate_cube, leaf_prefix, data_version = loaded
+    cause_hierarchy = CauseHierarchy(disease_hierarchy['causes'])
+    available_years = [int(year) for year in rate_cube.years]
+    return disease_hierarchy, cause_hierarchy, location_dict, rate_cube, leaf_prefix, available_years, data_version
+
+class Release:
+    """Everything built from one version of the source files.
+
+    Each request reads the release that was current when it started (see
+    ``pin_release``), so a reload never mixes two versions in one response.
+    """
+
+    def __init__(self, disease_hierarchy, cause_hierarchy, location_dict, rate_cube, leaf_prefix, available_years, version):
+        self.disease_hierarchy = disease_hierarchy
+        self.cause_hierarchy = cause_hierarchy
+        self.location_dict = location_dict
+        self.rate_cube = rate_cube
+        self.leaf_prefix = leaf_prefix
+        self.available_years = available_years
+        self.version = version
+        self.hierarchy_cube_index = np.array([rate_cube.cause_index.get(cause_id, -1) for cause_id in cause_hierarchy.order], dtype=np.intp)
+        self.metadata_bodies = {name: PrecompressedBody(json_body(obj)) for name, obj in (('diseases', disease_hierarchy), ('locations', location_dict), ('years', available_years))}
+        self.world_map_body = PrecompressedBody(json_body(build_world_map(WORLD_MAP_PATH, location_dict)))
+        self.world_map_version = self.world_map_body.etags['identity'][:16]
+        self.warm_up = None
+
+def json_body(obj):
+    return app.json.dumps(obj).encode('utf-8')
+
+active_release = contextvars.ContextVar('active_release', default=None)
+current_release = None
+
+def release():
+    return active_release.get() or current_release
+
+# The module-level names the endpoints use resolve to the request's release.
+disease_hierarchy = LocalProxy(lambda: release().disease_hierarchy)
+cause_hierarchy = LocalProxy(lambda: release().cause_hierarchy)
+location_dict = LocalProxy(lambda: release().location_dict)
+rate_cube = LocalProxy(lambda: release().rate_cube)
+leaf_prefix = LocalProxy(lambda: release().leaf_prefix)
+available_years = LocalProxy(lambda: release().available_years)
+data_version = LocalProxy(lambda: release().version)
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+batch_slices = contextvars.ContextVar('batch_slices', default=None)
+
+@app.before_request
+def pin_release():
+    # Batch sub-requests run inside their parent and keep its release.
+    if active_release.get() is None:
+        request.release_token = active_release.set(current_release)
+
+@app.teardown_request
+def unpin_release(exc):
+    token = getattr(request, 'release_token', None)
+    if token is not None:
+        active_release.reset(token)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.context_processor
+def inject_data_version():
+    return {'data_version': release().version, 'world_map_version': release().world_map_version}
+
+@functools.lru_cache(maxsize=None)
+def hash_static_file(path, mtime_ns):
+    return snapshot.file_sha256(path)[:12]
+
+def static_file_hash(filename):
+    path = os.path.join(app.static_folder, filename)
+    try:
+        return hash_static_file(path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return None
+
+@app.url_defaults
+def add_static_file_hash(endpoint, values):
+    # Static URLs carry a hash of the file content, so they can be cached
+    # for good and still change whenever the file does.
+    if endpoint == 'static' and 'v' not in values:
+        file_hash = static_file_hash(values['filename'])
+        if file_hash:
+            values['v'] = file_hash
+
+@app.after_request
+def cache_hashed_static_files(response):
+    if request.endpoint == 'static' and response.status_code == 200 and request.args.get('v') == static_file_hash(request.view_args['filename']):
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+@app.after_request
+def compress(response):
+    return compress_response(request, response, app.config['COMPRESS_LEVEL'], app.config['COMPRESS_BROTLI_QUALITY'], app.config['COMPRESS_MIN_SIZE'])
+
+def metadata_response(body):
+    # Only a URL that names the current data version may be cached for
+    # good; bare URLs are revalidated against the ETag.
+    return body.response(request, app.response_class, IMMUTABLE if request.args.get('v') == release().version else 'no-cache')
+
+@app.route('/maps/world-<version>.json')
+def get_world_map(version):
+    current = release()
+    return current.world_map_body.response(request, app.response_class, IMMUTABLE if version == current.world_map_version else 'no-cache')
+
 @app.route('/api/diseases')
 def get_diseases():
-    return jsonify(disease_hierarchy)
+    return metadata_response(release().metadata_bodies['diseases'])
 
 @app.route('/api/locations')
 def get_locations():
-    return jsonify(location_dict)
+    return metadata_response(release().metadata_bodies['locations'])
 
 @app.route('/api/years')
 def get_years():
-    return jsonify(available_years)
+    return metadata_response(release().metadata_bodies['years'])
 
 def expand_disease_ids(disease_ids):
-    expanded_ids = set(disease_ids)
-    
-    def add_children(disease_id, causes):
-        for cause in causes:
-            if int(cause['id']) == disease_id:
-                if 'subcauses' in cause and cause['subcauses']:
-                    for subcause in cause['subcauses']:
-                        subcause_id = int(subcause['id'])
-                        expanded_ids.add(subcause_id)
-                        if 'subcauses' in subcause and subcause['subcauses']:
-                            add_children(subcause_id, [subcause])
-                return
-            if 'subcauses' in cause and cause['subcauses']:
-                add_children(disease_id, cause['subcauses'])
-    
-    for disease_id in list(disease_ids):
-        add_children(disease_id, disease_hierarchy['causes'])
-    
-    return list(expanded_ids)
+    return list(cause_hierarchy.expand(disease_ids))
 
 def expand_disease_leaf_ids(disease_ids):
-    expanded_ids = set()
-    # print("disease_ids",disease_ids)
-    def add_children(disease_id, causes):
-        # print("add_children", end=" | ")
-        # print("disease_id",disease_id, end=" | ")
-        for cause in causes:
-            if int(cause['id']) == disease_id:
-                if 'subcauses' in cause and cause['subcauses']:
-                    for subcause in cause['subcauses']:
-                        subcause_id = int(subcause['id'])
-                        if 'subcauses' in subcause and subcause['subcauses']:
-                            add_children(subcause_id, [subcause])
-                        else:
-                            subcause_id = int(subcause['id'])
-                            expanded_ids.add(subcause_id)
-                else:
-                    subcause_id = int(cause['id'])
-                    expanded_ids.add(subcause_id)
-                return
-            if 'subcauses' in cause and cause['subcauses']:
-                add_children(disease_id, cause['subcauses'])
-            elif int(cause['id']) == disease_id:
-                subcause_id = int(cause['id'])
-                expanded_ids.add(subcause_id)
-    for disease_id in list(disease_ids):
-        add_children(disease_id, disease_hierarchy['causes'])
-    return list(expanded_ids)
+    return list(cause_hierarchy.expand_leaves(disease_ids))
+
+def canonical_leaf_ids(disease_ids):
+    # None means "no disease filter", which is not the same as a selection
+    # that expands to no known leaves.
+    return tuple(sorted(cause_hierarchy.expand_leaves(disease_ids))) if disease_ids else None
+
+def leaf_selection(leaf_ids):
+    # A leaf selection is answered from the leaf prefix sums, one difference
+    # per run of adjacent leaves; no filter at all still sums every raw cause row.
+    current = release()
+    if leaf_ids is None:
+        return current.rate_cube, None
+    return current.leaf_prefix, current.cause_hierarchy.leaf_intervals(leaf_ids)
+
+def location_cube(location_id):
+    # Within one /api/batch request every sub-query for the same location
+    # reads a single copied slice instead of indexing the full cube again.
+    slices = batch_slices.get()
+    if slices is None:
+        return rate_cube
+    if location_id not in slices:
+        slices[location_id] = rate_cube.take_locations(rate_cube.locations([location_id]))
+    return slices[location_id]
+
+def canonical_sex_ids(sex_ids):
+    return tuple(sorted(set(sex_ids)))
+
+def cached_json(key, build, *args):
+    return cached_body(key, 'application/json', lambda: json_body(build(*args)))
+
+def versioned(key):
+    # Entries of a replaced release are never looked up again; see reload_release.
+    return (release().version,) + key
+
+def cached_body(key, mimetype, build):
+    body, etag = response_cache.get_or_build(versioned(key), build)
+    response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def wants_rate_blocks():
+    if request.args.get('format') == 'binary':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', rate_blocks.MIMETYPE]) == rate_blocks.MIMETYPE
+
+def cached_rates(key, build_json, build_blocks):
+    if wants_rate_blocks():
+        response = cached_body(key + ('binary',), rate_blocks.MIMETYPE, build_blocks)
+    else:
+        response = cached_json(key, build_json)
+    response.vary.add('Accept')
+    return response
+
+def build_rate_blocks(year_positions, leaf_ids, sex_ids, positive_only):
+    # Same selection rules as the JSON builders: the all-years map keeps only
+    # positive values, the single-year map keeps every cell that has data.
+    sex_idx = rate_cube.sexes(sex_ids)
+    cube, cause_idx = leaf_selection(leaf_ids)
+    values, present = cube.select(years=year_positions, sexes=sex_idx, causes=cause_idx)
+    sex_totals = values.sum(axis=3, dtype=np.float64)
+    totals = sex_totals.sum(axis=2)
+    if positive_only:
+        keep = np.concatenate([(totals > 0)[..., None], sex_totals > 0], axis=2)
+        years = np.flatnonzero(present.any(axis=(0, 2, 3)))
+    else:
+        sex_present = present.any(axis=3)
+        keep = np.concatenate([sex_present.any(axis=2)[..., None], sex_present], axis=2)
+        years = np.arange(len(year_positions))
+    table = np.where(keep, np.concatenate([totals[..., None], sex_totals], axis=2), np.nan)[:, years].transpose(1, 0, 2)
+    year_keys = [rate_cube.year_keys[year_positions[y]] for y in years]
+    statistics = {}
+    for year_str, year_table, year_keep in zip(year_keys, table, keep[:, years].transpose(1, 0, 2)):
+        year_totals = year_table[year_keep[:, 0], 0]
+        if year_totals.size:
+            statistics[year_str] = {'min': float(year_totals.min()),'max': float(year_totals.max()),'mean': float(year_totals.mean())}
+        else:
+            statistics[year_str] = {'min': 0, 'max': 0, 'mean': 0}
+    columns = ['total'] + [rate_cube.sex_keys[s] for s in sex_idx]
+    return rate_blocks.encode(year_keys, rate_cube.location_ids, columns, table, statistics)
 
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    return jsonify(response_cache.stats())
 
 @app.route('/api/country-history')
 def get_country_history():
@@ -171,14 +306,12 @@ def get_country_history():
         return jsonify({})
     disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
     sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
-    if disease_ids:
-        disease_ids = expand_disease_leaf_ids(disease_ids)
-    filtered_data = rate_data[ (rate_data['location_id'] == int(location_id)) & (rate_data['sex_id'].isin(sex_ids)) ]
-    if disease_ids:
-        filtered_data = filtered_data[filtered_data['cause_id'].isin(disease_ids)]
+    cube, cause_idx = leaf_selection(canonical_leaf_ids(disease_ids))
+    values, present = cube.select(locations=rate_cube.locations([int(location_id)]), sexes=rate_cube.sexes(sex_ids), causes=cause_idx)
+    total_by_year = values.sum(axis=(0, 2, 3), dtype=np.float64)
+    years = np.flatnonzero(present.any(axis=(0, 2, 3)))
     result = {}
-    total_by_year = filtered_data.groupby('year')['val'].sum().reset_index()
-    result['total'] = {str(int(row['year'])): float(row['val']) for _, row in total_by_year.iterrows()}
+    result['total'] = dict(zip([rate_cube.year_keys[y] for y in years], total_by_year[years].tolist()))
     return jsonify(result)
 
 @app.route('/api/all-years-data')
@@ -187,43 +320,84 @@ def get_all_years_data():
     sexes = request.args.get('sexes', '1,2')
     disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
     sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
-    if disease_ids:
-        disease_ids = expand_disease_leaf_ids(disease_ids)
-    filtered_data = rate_data[rate_data['sex_id'].isin(sex_ids)]
-    if disease_ids:
-        filtered_data = filtered_data[filtered_data['cause_id'].isin(disease_ids)]
+    leaf_ids, sex_ids = canonical_leaf_ids(disease_ids), canonical_sex_ids(sex_ids)
+    return cached_rates(*all_years_query(leaf_ids, sex_ids))
+
+def all_years_query(leaf_ids, sex_ids):
+    return ('all-years-data', leaf_ids, sex_ids), lambda: build_all_years_data(leaf_ids, sex_ids), lambda: build_rate_blocks(rate_cube.year_positions(), leaf_ids, sex_ids, positive_only=True)
+
+def build_all_years_data(leaf_ids, sex_ids):
     result = {}
     stats = {}
-    for year in available_years:
-        year_str = str(year)
-        year_data = filtered_data[filtered_data['year'] == year]
-        if year_data.empty:
+    for year_str, year_result, year_stats in iter_all_years_data(leaf_ids, sex_ids):
+        result[year_str] = year_result
+        stats[year_str] = year_stats
+    return {'yearData': result,'statistics': stats}
+
+def iter_all_years_data(leaf_ids, sex_ids):
+    # One year at a time, so the streaming endpoint can send the first frame
+    # before the later years are reduced. The arrays are looked up now rather
+    # than in the generator, so a streamed body stays on the release of the
+    # request that started it.
+    axes = release().rate_cube
+    cube, cause_idx = leaf_selection(leaf_ids)
+    return all_years_frames(axes, cube, cause_idx, axes.sexes(sex_ids))
+
+def all_years_frames(rate_cube, cube, cause_idx, sex_idx):
+    sex_keys = [rate_cube.sex_keys[s] for s in sex_idx]
+    for y in range(len(rate_cube.years)):
+        values, present = cube.select(years=np.array([y]), sexes=sex_idx, causes=cause_idx)
+        if not present.any():
             continue
-        year_result = {}
-        country_totals = year_data.groupby('location_id')['val'].sum().reset_index()
-        for _, row in country_totals.iterrows():
-            location_id = str(int(row['location_id']))
-            val = float(row['val'])
-            if val > 0:
-                if location_id not in year_result:
-                    year_result[location_id] = {}
-                year_result[location_id]['total'] = val
-        sex_data = year_data.groupby(['location_id', 'sex_id'])['val'].sum().reset_index()
-        for _, row in sex_data.iterrows():
-            location_id = str(int(row['location_id']))
-            sex_id = str(int(row['sex_id']))
-            val = float(row['val'])
-            if val > 0:
-                if location_id not in year_result:
-                    year_result[location_id] = {}
-                year_result[location_id][sex_id] = val
-        totals = [data.get('total', 0) for data in year_result.values()]
-        if totals:
-            stats[year_str] = {'min': float(min(totals)) if totals else 0,'max': float(max(totals)) if totals else 0,'mean': float(np.mean(totals)) if totals else 0}
+        sex_totals = values[:, 0].sum(axis=2, dtype=np.float64)
+        country_totals = sex_totals.sum(axis=1)
+        locations = np.flatnonzero(country_totals > 0)
+        totals = country_totals[locations]
+        year_result = {rate_cube.location_keys[l]: {'total': total, **{sex_id: val for sex_id, val in zip(sex_keys, row) if val > 0}} for l, total, row in zip(locations.tolist(), totals.tolist(), sex_totals[locations].tolist())}
+        if totals.size:
+            year_stats = {'min': float(totals.min()),'max': float(totals.max()),'mean': float(totals.mean())}
         else:
-            stats[year_str] = {'min': 0, 'max': 0, 'mean': 0}
-        result[year_str] = year_result
-    return jsonify({'yearData': result,'statistics': stats})
+            year_stats = {'min': 0, 'max': 0, 'mean': 0}
+        yield rate_cube.year_keys[y], year_result, year_stats
+
+@app.route('/api/all-years-data/stream')
+def stream_all_years_data():
+    diseases = request.args.get('diseases', '')
+    sexes = request.args.get('sexes', '1,2')
+    disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
+    sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
+    leaf_ids, sex_ids = canonical_leaf_ids(disease_ids), canonical_sex_ids(sex_ids)
+    key = versioned(all_years_stream_key(leaf_ids, sex_ids))
+    entry = response_cache.get(key)
+    if entry is not None:
+        # A warmed or previously streamed selection is already complete: it
+        # is sent as one body, with an ETag to revalidate against.
+        body, etag = entry
+        response = Response(body, mimetype='application/x-ndjson')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    # Any other is reduced year by year as it is sent, one frame per chunk so
+    # each is compressed and flushed on its own, and cached once complete.
+    # No make_conditional here: it would buffer the whole stream.
+    response = Response(cache_when_complete(key, iter_all_years_frames(leaf_ids, sex_ids)), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def all_years_stream_key(leaf_ids, sex_ids):
+    return ('all-years-data', leaf_ids, sex_ids, 'ndjson')
+
+def iter_all_years_frames(leaf_ids, sex_ids):
+    return (json_body({'year': year_str, 'data': year_result, 'statistics': year_stats}) + b'\n' for year_str, year_result, year_stats in iter_all_years_data(leaf_ids, sex_ids))
+
+def cache_when_complete(key, frames):
+    # A stream the client abandons is never cached.
+    sent = []
+    for frame in frames:
+        sent.append(frame)
+        yield frame
+    response_cache.put(key, b''.join(sent))
 
 @app.route('/api/all-countries-rates')
 def get_all_countries_rates():
@@ -232,36 +406,130 @@ def get_all_countries_rates():
     sexes = request.args.get('sexes', '1,2')
     disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
     sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
-    if disease_ids:
-        disease_ids = expand_disease_leaf_ids(disease_ids)
-    # print("disease_ids",disease_ids)
-    filtered_data = rate_data[ (rate_data['year'] == year) & (rate_data['sex_id'].isin(sex_ids)) ]
-    if disease_ids:
-        filtered_data = filtered_data[filtered_data['cause_id'].isin(disease_ids)]
-    result = {}
-    aggregated_data = filtered_data.groupby(['location_id', 'sex_id'])['val'].sum().reset_index()
-    for _, row in aggregated_data.iterrows():
-        location_id = str(int(row['location_id']))
-        sex_id = str(int(row['sex_id']))
-        val = float(row['val'])
-        # print(row)
-        if location_id not in result:
-            result[location_id] = {}
-        result[location_id][sex_id] = val
-    total_rates = filtered_data.groupby('location_id')['val'].sum().reset_index()
-    rates = []
-    for _, row in total_rates.iterrows():
-        location_id = str(int(row['location_id']))
-        total = float(row['val'])
-        if location_id not in result:
-            result[location_id] = {}
-        result[location_id]['total'] = total
-        rates.append(total)
-    if rates:
-        result['_statistics'] = {'min': float(min(rates)),'max': float(max(rates)),'mean': float(np.mean(rates))}
+    leaf_ids, sex_ids = canonical_leaf_ids(disease_ids), canonical_sex_ids(sex_ids)
+    return cached_rates(*all_countries_query(year, leaf_ids, sex_ids))
+
+def all_countries_query(year, leaf_ids, sex_ids):
+    return ('all-countries-rates', year, leaf_ids, sex_ids), lambda: build_all_countries_rates(year, leaf_ids, sex_ids), lambda: build_rate_blocks(rate_cube.year_positions([year]), leaf_ids, sex_ids, positive_only=False)
+
+def build_all_countries_rates(year, leaf_ids, sex_ids):
+    sex_idx = rate_cube.sexes(sex_ids)
+    cube, cause_idx = leaf_selection(leaf_ids)
+    values, present = cube.select(years=rate_cube.year_positions([year]), sexes=sex_idx, causes=cause_idx)
+    aggregated_data = values.sum(axis=(1, 3), dtype=np.float64)
+    has_sex = present.any(axis=(1, 3))
+    sex_keys = [rate_cube.sex_keys[s] for s in sex_idx]
+    locations = np.flatnonzero(has_sex.any(axis=1))
+    rates = aggregated_data[locations].sum(axis=1)
+    result = {rate_cube.location_keys[l]: {**{sex_id: val for sex_id, val, has in zip(sex_keys, row, has_row) if has}, 'total': total} for l, row, has_row, total in zip(locations.tolist(), aggregated_data[locations].tolist(), has_sex[locations].tolist(), rates.tolist())}
+    if rates.size:
+        result['_statistics'] = {'min': float(rates.min()),'max': float(rates.max()),'mean': float(rates.mean())}
     else:
         result['_statistics'] = {'min': 0,'max': 0,'mean': 0}
-    return jsonify(result)
+    return result
+
+@app.route('/api/top-countries')
+def get_top_countries():
+    # Either one year, or every year in [start_year, end_year] (all years by
+    # default), each ranked on its own for bar-race style animations.
+    diseases = request.args.get('diseases', '')
+    sexes = request.args.get('sexes', '1,2')
+    try:
+        n = int(request.args.get('n', 10))
+        if 'year' in request.args:
+            start_year = end_year = int(request.args['year'])
+        else:
+            start_year = int(request.args.get('start_year', available_years[0]))
+            end_year = int(request.args.get('end_year', available_years[-1]))
+        disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
+        sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
+    except ValueError:
+        return jsonify({"error": "Invalid parameter format"})
+    if n < 1:
+        return jsonify({"error": "n must be at least 1"})
+    years = tuple(year for year in available_years if start_year <= year <= end_year)
+    leaf_ids, sex_ids = canonical_leaf_ids(disease_ids), canonical_sex_ids(sex_ids)
+    return cached_json(('top-countries', years, leaf_ids, sex_ids, n), build_top_countries, years, leaf_ids, sex_ids, n)
+
+def build_top_countries(years, leaf_ids, sex_ids, n):
+    year_positions = rate_cube.year_positions(years)
+    sex_idx = rate_cube.sexes(sex_ids)
+    cube, cause_idx = leaf_selection(leaf_ids)
+    values, present = cube.select(years=year_positions, sexes=sex_idx, causes=cause_idx)
+    sex_totals = values.sum(axis=3, dtype=np.float64)
+    # Locations without any data for a year rank below every real value.
+    totals = np.where(present.any(axis=(2, 3)), sex_totals.sum(axis=2), -np.inf)
+    k = min(n, totals.shape[0])
+    if not k:
+        return {rate_cube.year_keys[y]: [] for y in year_positions}
+    # Partial selection of the k largest per year, then a sort of just those.
+    top = np.argpartition(-totals, k - 1, axis=0)[:k]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(totals, top, axis=0), axis=0, kind='stable'), axis=0)
+    sex_keys = [rate_cube.sex_keys[s] for s in sex_idx]
+    result = {}
+    for y, year_position in enumerate(year_positions.tolist()):
+        ranking = []
+        for l in top[:, y].tolist():
+            if totals[l, y] == -np.inf:
+                break
+            location_id = int(rate_cube.location_ids[l])
+            ranking.append({'location_id': location_id, 'name': location_dict.get(location_id, "Unknown Country"), 'total': float(totals[l, y]), **dict(zip(sex_keys, sex_totals[l, y].tolist()))})
+        result[rate_cube.year_keys[year_position]] = ranking
+    return result
+
+@functools.lru_cache(maxsize=TRAJECTORY_CACHE_SIZE)
+def trajectory_matrix(version, leaf_ids, sex_ids):
+    """Z-normalized yearly rate trajectory of every location for one
+    selection, and which locations have a complete, non-constant one."""
+    cube, cause_idx = leaf_selection(leaf_ids)
+    values, present = cube.select(sexes=rate_cube.sexes(sex_ids), causes=cause_idx)
+    totals = values.sum(axis=(2, 3), dtype=np.float64)
+    std = totals.std(axis=1)
+    valid = present.any(axis=(2, 3)).all(axis=1) & (std > 0)
+    z = np.zeros_like(totals)
+    z[valid] = (totals[valid] - totals[valid].mean(axis=1, keepdims=True)) / std[valid, None]
+    z.flags.writeable = False
+    return z, valid
+
+@app.route('/api/similar-countries')
+def get_similar_countries():
+    location_id = request.args.get('location', '')
+    diseases = request.args.get('diseases', '')
+    sexes = request.args.get('sexes', '1,2')
+    if not location_id:
+        return jsonify({"error": "Missing required parameters"})
+    try:
+        location_id = int(location_id)
+        k = int(request.args.get('k', 5))
+        disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
+        sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
+    except ValueError:
+        return jsonify({"error": "Invalid parameter format"})
+    leaf_ids, sex_ids = canonical_leaf_ids(disease_ids), canonical_sex_ids(sex_ids)
+    return cached_json(('similar-countries', location_id, leaf_ids, sex_ids, k), build_similar_countries, location_id, leaf_ids, sex_ids, k)
+
+def build_similar_countries(location_id, leaf_ids, sex_ids, k):
+    z, valid = trajectory_matrix(release().version, leaf_ids, sex_ids)
+    l = rate_cube.location_index.get(location_id)
+    if l is None or not valid[l]:
+        return []
+    years = z.shape[1]
+    # For z-normalized series the squared Euclidean distance is
+    # 2 * years * (1 - correlation), so one matrix-vector product ranks both.
+    correlation = z @ z[l] / years
+    candidates = np.flatnonzero(valid)
+    candidates = candidates[candidates != l]
+    k = min(k, len(candidates))
+    if k < 1:
+        return []
+    nearest = candidates[np.argpartition(-correlation[candidates], k - 1)[:k]]
+    nearest = nearest[np.argsort(-correlation[nearest], kind='stable')]
+    distances = np.sqrt(np.maximum(0, 2 * years * (1 - correlation[nearest])))
+    result = []
+    for n, distance in zip(nearest.tolist(), distances.tolist()):
+        other_id = int(rate_cube.location_ids[n])
+        result.append({'location_id': other_id, 'name': location_dict.get(other_id, "Unknown Country"), 'distance': distance, 'correlation': float(correlation[n])})
+    return result
 
 @app.route('/country/<location_id>')
 def country_detail(location_id):
@@ -281,50 +549,39 @@ def get_disease_rates_by_level1():
         return jsonify({})
     disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
     sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
-    level1_mapping = {}
-    level1_names = {}
-
-    def map_diseases_to_level1(causes, parent_id=None):
-        for cause in causes:
-            cause_id = int(cause['id'])
-            cause_code = cause.get('cause', '')
-            is_level1 = cause_code and len(cause_code) == 1
-            if is_level1:
-                level1_mapping[cause_id] = cause_id
-                level1_names[cause_id] = cause['name']
-                current_parent = cause_id
-            else:
-                if parent_id:
-                    level1_mapping[cause_id] = parent_id
-                current_parent = parent_id
-            if 'subcauses' in cause and cause['subcauses']:
-                map_diseases_to_level1(cause['subcauses'], current_parent)
-    map_diseases_to_level1(disease_hierarchy['causes'])
-    filtered_data = rate_data[ (rate_data['location_id'] == int(location_id)) & (rate_data['sex_id'].isin(sex_ids)) ]
+    sex_idx = rate_cube.sexes(sex_ids)
     if disease_ids:
-        expanded_ids = expand_disease_leaf_ids(disease_ids)
-        filtered_data = filtered_data[filtered_data['cause_id'].isin(expanded_ids)]
+        cause_idx = rate_cube.causes(expand_disease_leaf_ids(disease_ids))
+    else:
+        cause_idx = rate_cube.causes()
+    selected = set(disease_ids)
+    cause_level1 = [cause_hierarchy.level1.get(int(rate_cube.cause_ids[c])) for c in cause_idx]
+    keep = [level1_id is not None and (level1_id in selected or int(rate_cube.cause_ids[c]) in selected) for c, level1_id in zip(cause_idx, cause_level1)]
+    level1_ids = sorted({level1_id for level1_id, k in zip(cause_level1, keep) if k})
+    if not level1_ids:
+        return jsonify({})
+    membership = np.zeros((len(cause_idx), len(level1_ids)))
+    for c, (level1_id, k) in enumerate(zip(cause_level1, keep)):
+        if k:
+            membership[c, level1_ids.index(level1_id)] = 1
+    cube = location_cube(int(location_id))
+    locations = cube.locations([int(location_id)])
+    if not len(locations):
+        return jsonify({})
+    values, present = cube.select(locations=locations, sexes=sex_idx, causes=cause_idx)
+    level1_values = values[0] @ membership
+    level1_present = present[0].astype(np.float64) @ membership > 0
+    sex_keys = [rate_cube.sex_keys[s] for s in sex_idx]
     result = {}
-    for _, row in filtered_data.iterrows():
-        year = str(int(row['year']))
-        disease_id = int(row['cause_id'])
-        sex_id = str(int(row['sex_id']))
-        val = float(row['val'])
-        if disease_id not in level1_mapping:
+    for k, level1_id in enumerate(level1_ids):
+        has_sex = level1_present[:, :, k]
+        years = np.flatnonzero(has_sex.any(axis=1))
+        if not years.size:
             continue
-        level1_id = level1_mapping[disease_id]
-        if level1_id not in disease_ids and disease_id not in disease_ids:
-            continue
-        if level1_id not in result:
-            result[level1_id] = {'name': level1_names.get(level1_id, f"Disease {level1_id}"),'data': {}}
-        if year not in result[level1_id]['data']:
-            result[level1_id]['data'][year] = {}
-        if 'total' not in result[level1_id]['data'][year]:
-            result[level1_id]['data'][year]['total'] = 0
-        if sex_id not in result[level1_id]['data'][year]:
-            result[level1_id]['data'][year][sex_id] = 0
-        result[level1_id]['data'][year][sex_id] += val
-        result[level1_id]['data'][year]['total'] += val
+        data = {}
+        for y, row, has_row in zip(years.tolist(), level1_values[years, :, k].tolist(), has_sex[years].tolist()):
+            data[rate_cube.year_keys[y]] = {'total': sum(val for val, has in zip(row, has_row) if has), **{sex_id: val for sex_id, val, has in zip(sex_keys, row, has_row) if has}}
+        result[level1_id] = {'name': cause_hierarchy.names.get(level1_id, f"Disease {level1_id}"),'data': data}
     return jsonify(result)
 
 @app.route('/disease_drilldown/<location_id>/<year>/<disease_id>')
@@ -338,61 +595,39 @@ def disease_drilldown(location_id, year, disease_id):
     except (ValueError, TypeError):
         country_name = "Unknown Country"
         disease_name = "Unknown Disease"
-    diseases = request.args.get('diseases', '')
-    sexes = request.args.get('sexes', '1,2')
     if not all([year, location_id]):
         return jsonify({"error": "Missing required parameters"})
-    try:
-        disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
-        sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
-    except ValueError:
-        return jsonify({"error": "Invalid parameter format"})
-    update_dtree(disease_ids, location_id, sex_ids, year)
     return render_template('disease_drilldown.html',location_id=location_id, country_name=country_name,year=year,disease_id=disease_id, disease_name=disease_name)
 
 def get_disease_name(disease_id):
-    def find_disease(causes, target_id):
-        for cause in causes:
-            if int(cause['id']) == target_id:
-                return cause['name']
-            if 'subcauses' in cause and cause['subcauses']:
-                result = find_disease(cause['subcauses'], target_id)
-                if result:
-                    return result
-        return None
-    return find_disease(disease_hierarchy['causes'], disease_id) or "Unknown Disease"
+    return cause_hierarchy.names.get(disease_id) or "Unknown Disease"
 
 @app.route('/api/disease_children')
 def get_disease_children():
     parent_id = request.args.get('parent_id')
     year = request.args.get('year')
     location_id = request.args.get('location_id')
+    diseases = request.args.get('diseases', '')
+    sexes = request.args.get('sexes', '1,2')
     if not all([parent_id, year, location_id]):
         return jsonify({"error": "Missing required parameters"})
     try:
         parent_id = int(parent_id)
         year = int(year)
         location_id = int(location_id)
+        disease_ids = [int(d) for d in diseases.split(',') if d] if diseases else []
+        sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
     except ValueError:
         return jsonify({"error": "Invalid parameter format"})
-
-    def find_children(causes, target_id):
-        node = dtree.get_node(target_id)
-        return node.children
-    children_ids = find_children(disease_hierarchy['causes'], parent_id)
+    children_ids = cause_hierarchy.children.get(parent_id)
     if not children_ids:
         return jsonify([])
-    # print(children_ids)
+    rollup = roll_up_disease_values(disease_ids, location_id, sex_ids, year)
     result = []
-    for child_node in children_ids:
-        child_id = child_node.disease_id
-        if child_id == None:
+    for child_id in children_ids:
+        if not rollup.is_visible(child_id):
             continue
-        node = dtree.get_node(child_id)
-        child_rate = node.value
-        if node.taken==False and child_rate==0:
-            continue
-        result.append({"id": child_id,"name": node.disease_name,"cause_code": "","has_children": False if len(node.children)==0 else True,"value": child_rate})
+        result.append({"id": child_id,"name": cause_hierarchy.names[child_id],"cause_code": "","has_children": len(cause_hierarchy.children[child_id]) > 0,"value": rollup.value(child_id)})
     return jsonify(result)
 
 @app.route('/api/disease_details')
@@ -410,72 +645,32 @@ def get_disease_details():
         sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
     except ValueError:
         return jsonify({"error": "Invalid parameter format"})
-    
-    def find_disease(causes, target_id):
-        for cause in causes:
-            if int(cause['id']) == target_id:
-                has_children = 'subcauses' in cause and len(cause['subcauses']) > 0
-                return {"id": target_id,"name": cause['name'],"cause_code": cause.get('cause', ''),"has_children": has_children}
-            if 'subcauses' in cause and cause['subcauses']:
-                result = find_disease(cause['subcauses'], target_id)
-                if result:
-                    return result
-        return None
-    disease_info = find_disease(disease_hierarchy['causes'], disease_id)
+    disease_info = cause_hierarchy.info(disease_id)
     if not disease_info:
         return jsonify({"error": "Disease not found"})
-    filtered_data = rate_data[(rate_data['location_id'] == location_id) & (rate_data['year'] == year) & (rate_data['cause_id'] == disease_id) & (rate_data['sex_id'].isin(sex_ids)) ]
+    cube = location_cube(location_id)
+    values, present = cube.select(locations=cube.locations([location_id]), years=rate_cube.year_positions([year]), sexes=rate_cube.sexes(), causes=rate_cube.causes([disease_id]))
+    sex_values = dict(zip(rate_cube.sex_ids.tolist(), values.sum(axis=(0, 1, 3), dtype=np.float64).tolist()))
+    sex_present = dict(zip(rate_cube.sex_ids.tolist(), present.any(axis=(0, 1, 3)).tolist()))
     rates = {"total": 0}
-    if not filtered_data.empty:
-        total_rate = float(filtered_data['val'].sum())
+    if any(sex_present.get(sex_id, False) for sex_id in set(sex_ids)):
+        total_rate = sum(sex_values[sex_id] for sex_id in set(sex_ids) if sex_present.get(sex_id, False))
         rates["total"] = total_rate
         for sex_id in sex_ids:
-            sex_data = filtered_data[filtered_data['sex_id'] == sex_id]
-            if not sex_data.empty:
-                rates[str(sex_id)] = float(sex_data['val'].sum())
+            if sex_present.get(sex_id, False):
+                rates[str(sex_id)] = sex_values[sex_id]
             else:
                 rates[str(sex_id)] = 0
     result = {**disease_info,"rates": rates,"country_name": location_dict.get(location_id, "Unknown Country"),"year": year}
     return jsonify(result)
 
-def set_as_taken_dtree(diseases_ids, values):
-    # print(diseases_ids, values)
-    for id in diseases_ids:
-        node = dtree.get_node(id)
-        node.taken=True
-        value = values[id]
-        dtree.update_value(id, value, taken=True)
-        node.value = value
-
-def add_untill_taken(diseases_ids, values):
-    # print(diseases_ids, values)
-    def go_up(id, val):
-        # print(f"go_up|| id:{id}, val:{val} ")
-        if id == None:
-            return
-        node = dtree.get_node(id)
-        if node.taken==True:
-            return
-        node.value = node.value + val
-        dtree.update_value(id, node.value)
-        # print("node.value", node.value)
-        go_up(node.parent_id, val) 
-
-    for id in diseases_ids:
-        node = dtree.get_node(id)
-        go_up(node.parent_id,values[id])
-
-def update_dtree(disease_ids,location_id,sex_ids,  year):
-    # print("update_dtree")
-    filtered_data = rate_data[ (rate_data['location_id'] == location_id) & (rate_data['year'] == year) & (rate_data['sex_id'].isin(sex_ids)) ]
-    dtree.reset_all_values()
-    values={}
-    expanded_ids = expand_disease_ids(disease_ids)
-    for id in expanded_ids:
-        disease_data = filtered_data[filtered_data['cause_id'] == id]
-        values[id]=float(disease_data['val'].sum()) if not disease_data.empty else 0
-    set_as_taken_dtree(expanded_ids, values)
-    add_untill_taken(expanded_ids, values)
+def roll_up_disease_values(disease_ids, location_id, sex_ids, year):
+    cube = location_cube(location_id)
+    cause_values, _ = cube.select(locations=cube.locations([location_id]), years=rate_cube.year_positions([year]), sexes=rate_cube.sexes(sex_ids))
+    cause_totals = cause_values.sum(axis=(0, 1, 2), dtype=np.float64)
+    cube_index = release().hierarchy_cube_index
+    values = np.where(cube_index >= 0, cause_totals[cube_index], 0) if cause_totals.size else np.zeros(len(cube_index))
+    return cause_hierarchy.roll_up(cause_hierarchy.expand(disease_ids), values)
 
 @app.route('/api/hierarchical-disease-data')
 def get_hierarchical_disease_data():
@@ -492,31 +687,177 @@ def get_hierarchical_disease_data():
         sex_ids = [int(s) for s in sexes.split(',') if s] if sexes else [1, 2]
     except ValueError:
         return jsonify({"error": "Invalid parameter format"})
-    if disease_ids:
-        expanded_ids = expand_disease_ids(disease_ids)
-    else:
-        expanded_ids = []
-    filtered_data = rate_data[ (rate_data['location_id'] == location_id) & (rate_data['year'] == year) & (rate_data['sex_id'].isin(sex_ids)) ]
-    if expanded_ids:
-        filtered_data = filtered_data[filtered_data['cause_id'].isin(expanded_ids)]
+    expanded_ids, sex_ids = tuple(sorted(cause_hierarchy.expand(disease_ids))), canonical_sex_ids(sex_ids)
+    return cached_json(('hierarchical-disease-data', location_id, year, expanded_ids, sex_ids), build_hierarchical_disease_data, location_id, year, expanded_ids, sex_ids)
+
+def build_hierarchical_disease_data(location_id, year, disease_ids, sex_ids):
     sunburst_data = []
     sunburst_data.append({"id": "root","name": "All Diseases","parent": "","value": 0})
 
+    rollup = roll_up_disease_values(disease_ids, location_id, sex_ids, year)
+
     def process_disease(disease_id, parent_id):
-        node = dtree.get_node(disease_id)
-        value = node.value
-        # print(f"value:{value}")
-        if node.taken==False and value==0:
+        if not rollup.is_visible(disease_id):
             return
-        sunburst_data.append({"id": str(disease_id), "name": node.disease_name, "parent": parent_id, "value": value })
-        for child in node.children:
-            process_disease(child.disease_id, str(disease_id) )
-    update_dtree(disease_ids, location_id, sex_ids, year)
-    for cause in disease_hierarchy['causes']:
-        process_disease( int(cause['id']), "root")
+        sunburst_data.append({"id": str(disease_id), "name": cause_hierarchy.names[disease_id], "parent": parent_id, "value": rollup.value(disease_id) })
+        for child_id in cause_hierarchy.children[disease_id]:
+            process_disease(child_id, str(disease_id) )
+    for disease_id in cause_hierarchy.roots:
+        process_disease(disease_id, "root")
     total_value = sum(item["value"] for item in sunburst_data if item["parent"] == "root")
     sunburst_data[0]["value"] = total_value
-    return jsonify(sunburst_data)
+    return sunburst_data
+
+def warm_rates(key, build_json, build_blocks, with_json=True):
+    response_cache.get_or_build(versioned(key + ('binary',)), build_blocks)
+    if with_json:
+        response_cache.get_or_build(versioned(key), lambda: json_body(build_json()))
+
+def warm_stream(leaf_ids, sex_ids):
+    response_cache.get_or_build(versioned(all_years_stream_key(leaf_ids, sex_ids)), lambda: b''.join(iter_all_years_frames(leaf_ids, sex_ids)))
+
+def warm_up_tasks():
+    # What the map asks for first: every cause and each level-1 cause with
+    # both sexes, the all-years stream the Play button reads and every
+    # single-year map (latest year first). The map requests single years in
+    # the binary format.
+    sex_ids = canonical_sex_ids(DEFAULT_SEX_IDS)
+    selections = [('all causes', None)]
+    selections += [(cause_hierarchy.names[cause_id], canonical_leaf_ids([cause_id])) for cause_id in sorted(set(cause_hierarchy.level1.values()))]
+    tasks = []
+    for label, leaf_ids in selections:
+        tasks.append((f"all-years-data {label}", functools.partial(warm_stream, leaf_ids, sex_ids)))
+        for year in reversed(available_years):
+            tasks.append((f"all-countries-rates {year} {label}", functools.partial(warm_rates, *all_countries_query(year, leaf_ids, sex_ids), with_json=year == available_years[-1])))
+    return tasks
+
+@app.route('/api/ready')
+def get_ready():
+    # 503 until the warm-up has finished, so a load balancer can hold
+    # traffic back from a cold process. Reloaded releases are warmed before
+    # they are swapped in.
+    warm_up = release().warm_up
+    return jsonify(warm_up.status()), 200 if warm_up.ready else 503
+
+def load_release(loaded=None):
+    new_release = Release(*(loaded or load_data()))
+    token = active_release.set(new_release)
+    try:
+        # Created while pinned, so its tasks run against this release.
+        new_release.warm_up = WarmUp(warm_up_tasks())
+    finally:
+        active_release.reset(token)
+    return new_release
+
+reload_lock = threading.Lock()
+reload_status = {'state': 'idle', 'error': None, 'started_at': None, 'finished_at': None}
+
+def reload_release():
+    """Build a release from the source files as they are now, warm it and
+    swap it in. Requests already running finish on the old one."""
+    global current_release
+    loaded = load_data()
+    # Nothing to swap in when the data did not change; skip building the
+    # release (world map, compressed bodies) only to throw it away.
+    if loaded[-1] == current_release.version:
+        return False
+    new_release = load_release(loaded)
+    new_release.warm_up.run()
+    current_release = new_release
+    response_cache.discard_where(lambda key: key[0] != new_release.version)
+    return True
+
+def start_reload():
+    if not reload_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        reload_status.update(state='running', error=None, started_at=time.time(), finished_at=None)
+        try:
+            reload_release()
+            reload_status.update(state='idle')
+        except Exception as exc:
+            reload_status.update(state='failed', error=repr(exc))
+        finally:
+            reload_status['finished_at'] = time.time()
+            reload_lock.release()
+    threading.Thread(target=run, name='reload', daemon=True).start()
+    return True
+
+def watch_sources(interval):
+    fingerprints = None
+    while True:
+        time.sleep(interval)
+        version, fingerprints = snapshot.current_version(SNAPSHOT_DIR, SOURCE_PATHS, fingerprints)
+        if version != current_release.version:
+            start_reload()
+
+def start_background_tasks():
+    """Warm the current release and, if configured, poll the source files
+    for a new data release. Called once per serving process."""
+    current_release.warm_up.start()
+    if RELOAD_POLL_SECONDS > 0:
+        threading.Thread(target=watch_sources, args=(RELOAD_POLL_SECONDS,), name='reload-watch', daemon=True).start()
+
+def admin_allowed():
+    # No loopback exception: behind a reverse proxy (and in batch
+    # sub-requests) every client appears to come from 127.0.0.1.
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+@app.route('/api/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    # POST starts a reload in the background; GET only reports on it.
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'POST':
+        start_reload()
+    return jsonify({**reload_status, 'version': current_release.version, 'reloading': reload_lock.locked()})
+
+@app.route('/api/batch', methods=['POST'])
+def get_batch():
+    # Body: {"queries": [{"path": "/api/years"}, {"path": "/api/country-history", "params": {...}}, ...]}
+    # Results come back in the same order, each with its own status.
+    payload = request.get_json(silent=True) or {}
+    queries = payload.get('queries')
+    if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+        return jsonify({"error": "Expected a list of queries"})
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({"error": f"At most {BATCH_MAX_QUERIES} queries per batch"})
+    results = []
+    token = batch_slices.set({})
+    try:
+        for query in queries:
+            results.append(run_batch_query(query.get('path', ''), query.get('params') or {}))
+    finally:
+        batch_slices.reset(token)
+    return jsonify({"results": results})
+
+def run_batch_query(path, params):
+    if not isinstance(path, str) or not path.startswith('/api/') or path.startswith(('/api/batch', '/api/admin/')):
+        return {"path": path, "status": 400, "data": {"error": "Unsupported path"}}
+    try:
+        with app.test_request_context(path, query_string=params):
+            response = app.full_dispatch_request()
+    except Exception as exc:
+        # One failing query must not lose the results of the others.
+        app.logger.exception("Batch query %s failed", path)
+        return {"path": path, "status": 500, "data": {"error": repr(exc)}}
+    if response.is_json:
+        return {"path": path, "status": response.status_code, "data": response.get_json()}
+    if response.status_code != 200:
+        return {"path": path, "status": response.status_code, "data": {"error": response.status}}
+    return {"path": path, "status": 400, "data": {"error": "Only JSON endpoints can be batched"}}
+
+current_release = load_release()
 
 if __name__ == '__main__':
-    app.run(debug=True,port=5000)
+    if '--build-snapshot' in sys.argv:
+        # Importing the module above already refreshed a stale snapshot.
+        print(f"Snapshot {data_version} is up to date in {SNAPSHOT_DIR}")
+        sys.exit(0)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Only in the reloader's serving child, not the watching parent.
+        start_background_tasks()
+    app.run(debug=True,port=5000,threaded=True)
@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'application/x-gbd-rate-blocks', 'application/javascript', 'text/javascript', 'text/css', 'text/html'}
+
+
+def supported_encodings():
+    """Content codings this process can produce, preferred first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(request, encodings):
+    return request.accept_encodings.best_match([e for e in supported_encodings() if e in encodings]) or 'identity'
+
+
+class PrecompressedBody:
+    """A serialized body compressed once, ahead of any request.
+
+    Each encoding gets its own strong ETag, since the bytes on the wire
+    differ between them.
+    """
+
+    def __init__(self, body, mimetype='application/json'):
+        self.mimetype = mimetype
+        self.encodings = {'identity': body, 'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {encoding: digest if encoding == 'identity' else f"{digest}-{encoding}" for encoding in self.encodings}
+
+    def response(self, request, response_class, cache_control):
+        encoding = negotiate(request, self.encodings)
+        response = response_class(self.encodings[encoding], mimetype=self.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(self.etags[encoding])
+        response.headers['Cache-Control'] = cache_control
+        return response.make_conditional(request)
+
+
+def _compressor(encoding, level, brotli_quality):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_chunks(chunks, encoding, level, brotli_quality, flush_each=False):
+    """Compress an iterable of chunks lazily. With ``flush_each`` every input
+    chunk is flushed to the output so streamed frames are not held back."""
+    process, flush, finish = _compressor(encoding, level, brotli_quality)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk)
+        if flush_each:
+            data += flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def compress_response(request, response, level=6, brotli_quality=5, min_size=1024):
+    """Content-encode a Flask response for the client's Accept-Encoding.
+
+    Buffered bodies under ``min_size`` bytes are left alone. Larger ones, and
+    streamed responses of any size, are compressed chunk by chunk as the
+    server writes them, so no second full-size copy of the body is built.
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request, supported_encodings())
+    if encoding == 'identity':
+        return response
+    if response.is_streamed:
+        chunks, flush_each = response.response, True
+    else:
+        body = memoryview(response.get_data())
+        if len(body) < min_size:
+            return response
+        chunks, flush_each = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)), False
+    response.response = compress_chunks(chunks, encoding, level, brotli_quality, flush_each)
+    response.headers['Content-Encoding'] = encoding
+    response.headers.pop('Content-Length', None)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The encoded bytes differ from the ones the strong ETag was computed
+        # over; a weak ETag still matches the identity one for If-None-Match.
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,155 @@
+from types import MappingProxyType
+
+import numpy as np
+
+
+class CauseHierarchy:
+    """Read-only index over the nested ``causes`` JSON tree.
+
+    Every lookup the endpoints need (parent, children, depth, leaf
+    descendants, whole subtree, name and cause code) is computed once here,
+    so expanding a selection is a set union instead of a tree walk.
+    ``level1`` maps each cause to the single-letter-coded top cause above it.
+    """
+
+    def __init__(self, causes):
+        parent = {}
+        children = {}
+        depth = {}
+        names = {}
+        codes = {}
+        level1 = {}
+        order = []
+
+        def visit(cause_list, parent_id, level, level1_id):
+            for cause in cause_list:
+                cause_id = int(cause['id'])
+                parent[cause_id] = parent_id
+                depth[cause_id] = level
+                names[cause_id] = cause['name']
+                codes[cause_id] = cause.get('cause', '')
+                if codes[cause_id] and len(codes[cause_id]) == 1:
+                    level1[cause_id] = cause_id
+                elif level1_id:
+                    level1[cause_id] = level1_id
+                order.append(cause_id)
+                subcauses = cause.get('subcauses') or []
+                children[cause_id] = tuple(int(sub['id']) for sub in subcauses)
+                visit(subcauses, cause_id, level + 1, level1.get(cause_id))
+
+        visit(causes, None, 0, None)
+
+        subtree = {}
+        leaves = {}
+        for cause_id in reversed(order):
+            kids = children[cause_id]
+            subtree[cause_id] = frozenset({cause_id}.union(*(subtree[k] for k in kids)))
+            leaves[cause_id] = frozenset().union(*(leaves[k] for k in kids)) if kids else frozenset({cause_id})
+
+        self.roots = tuple(int(cause['id']) for cause in causes)
+        self.order = tuple(order)
+        self.parent = MappingProxyType(parent)
+        self.children = MappingProxyType(children)
+        self.depth = MappingProxyType(depth)
+        self.names = MappingProxyType(names)
+        self.codes = MappingProxyType(codes)
+        self.level1 = MappingProxyType(level1)
+        self.subtree = MappingProxyType(subtree)
+        self.leaves = MappingProxyType(leaves)
+
+        # Array form of the tree for roll_up: causes are addressed by their
+        # position in ``order`` and grouped by depth, deepest level first.
+        self.position = MappingProxyType({cause_id: i for i, cause_id in enumerate(order)})
+        self.parent_position = np.array([self.position[parent[c]] if parent[c] is not None else -1 for c in order], dtype=np.intp)
+        depths = np.array([depth[c] for c in order], dtype=np.intp)
+        self.levels = tuple(np.flatnonzero(depths == d) for d in range(int(depths.max(initial=0)), 0, -1))
+        self.parent_position.flags.writeable = False
+
+        # Euler-tour intervals: ``order`` is a DFS pre-order, so the subtree of
+        # the cause at position p is order[p:subtree_end[p]], and its leaves are
+        # leaf_order[leaf_interval[c][0]:leaf_interval[c][1]].
+        subtree_end = np.arange(1, len(order) + 1, dtype=np.intp)
+        for p in range(len(order) - 1, -1, -1):
+            if self.parent_position[p] >= 0:
+                subtree_end[self.parent_position[p]] = max(subtree_end[self.parent_position[p]], subtree_end[p])
+        subtree_end.flags.writeable = False
+        self.subtree_end = subtree_end
+        self.leaf_order = tuple(c for c in order if not children[c])
+        self.leaf_position = MappingProxyType({cause_id: i for i, cause_id in enumerate(self.leaf_order)})
+        first_leaf = {}
+        for cause_id in reversed(order):
+            kids = children[cause_id]
+            first_leaf[cause_id] = first_leaf[kids[0]] if kids else self.leaf_position[cause_id]
+        self.leaf_interval = MappingProxyType({c: (first_leaf[c], first_leaf[c] + len(leaves[c])) for c in order})
+
+    def __contains__(self, cause_id):
+        return cause_id in self.parent
+
+    def __len__(self):
+        return len(self.order)
+
+    def expand(self, cause_ids):
+        """The given ids plus every descendant of the ones in the tree."""
+        return set(cause_ids).union(*(self.subtree[c] for c in cause_ids if c in self.subtree))
+
+    def expand_leaves(self, cause_ids):
+        """Leaf descendants of the given ids; a leaf expands to itself."""
+        return set().union(*(self.leaves[c] for c in cause_ids if c in self.leaves))
+
+    def roll_up(self, taken_ids, values):
+        """Propagate the values of ``taken_ids`` up to their untaken ancestors.
+
+        ``values`` holds one rate per cause in ``order``. A taken cause keeps
+        its own value; every other cause gets the sum of its children's
+        rolled-up values, which is the total of the topmost taken causes
+        below it.
+        """
+        taken = np.zeros(len(self.order), dtype=bool)
+        taken[[self.position[c] for c in taken_ids if c in self.position]] = True
+        values = np.asarray(values, dtype=np.float64)
+        accumulated = np.zeros(len(self.order))
+        for level in self.levels:
+            contribution = np.where(taken[level], values[level], accumulated[level])
+            np.add.at(accumulated, self.parent_position[level], contribution)
+        return RollUp(self, taken, np.where(taken, values, accumulated))
+
+    def leaf_intervals(self, leaf_ids):
+        """Merge ``leaf_ids`` into ``[start, end)`` runs of ``leaf_order``."""
+        positions = np.sort(np.array([self.leaf_position[c] for c in leaf_ids if c in self.leaf_position], dtype=np.intp))
+        if not positions.size:
+            return positions, positions
+        breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+        starts = positions[np.concatenate(([0], breaks))]
+        ends = positions[np.concatenate((breaks - 1, [len(positions) - 1]))] + 1
+        return starts, ends
+
+    def info(self, cause_id):
+        if cause_id not in self:
+            return None
+        return {"id": cause_id, "name": self.names[cause_id], "cause_code": self.codes[cause_id], "has_children": len(self.children[cause_id]) > 0}
+
+    def __repr__(self):
+        return f"CauseHierarchy({len(self)} causes)"
+
+
+class RollUp:
+    """Immutable per-request result of ``CauseHierarchy.roll_up``."""
+
+    def __init__(self, hierarchy, taken, values):
+        taken.flags.writeable = False
+        values.flags.writeable = False
+        self.hierarchy = hierarchy
+        self.taken = taken
+        self.values = values
+
+    def value(self, cause_id):
+        return float(self.values[self.hierarchy.position[cause_id]])
+
+    def is_taken(self, cause_id):
+        return bool(self.taken[self.hierarchy.position[cause_id]])
+
+    def is_visible(self, cause_id):
+        return self.is_taken(cause_id) or self.value(cause_id) != 0
+
+    def __repr__(self):
+        return f"RollUp({int(self.taken.sum())} taken of {len(self.taken)} causes)"
@@ -0,0 +1,54 @@
+"""
+Compact binary encoding of the per-location map rates.
+
+Layout (all integers and floats little-endian):
+    4 bytes   magic b'GBDR'
+    uint32    length H of the JSON header
+    H bytes   JSON header, space-padded to a multiple of 4 bytes:
+              {"version", "years", "columns", "locations", "statistics"}
+    int32[L]  location ids, sent once
+    float32[Y][L][C]  one row per year and location; the columns are
+              "total" followed by one per sex id. NaN marks a value the JSON
+              response would have left out.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'GBDR'
+VERSION = 1
+MIMETYPE = 'application/x-gbd-rate-blocks'
+
+
+def encode(years, location_ids, columns, table, statistics):
+    header = json.dumps({
+        'version': VERSION,
+        'years': list(years),
+        'columns': list(columns),
+        'locations': len(location_ids),
+        'statistics': statistics,
+    }).encode('utf-8')
+    header += b' ' * (-len(header) % 4)
+    return b''.join([
+        MAGIC,
+        struct.pack('<I', len(header)),
+        header,
+        np.asarray(location_ids, dtype='<i4').tobytes(),
+        np.ascontiguousarray(table, dtype='<f4').tobytes(),
+    ])
+
+
+def decode(body):
+    if body[:4] != MAGIC:
+        raise ValueError("not a rate block payload")
+    (header_length,) = struct.unpack_from('<I', body, 4)
+    header = json.loads(body[8:8 + header_length])
+    offset = 8 + header_length
+    count = header['locations']
+    location_ids = np.frombuffer(body, dtype='<i4', count=count, offset=offset)
+    offset += 4 * count
+    shape = (len(header['years']), count, len(header['columns']))
+    table = np.frombuffer(body, dtype='<f4', count=int(np.prod(shape)), offset=offset).reshape(shape)
+    return header, location_ids, table
@@ -0,0 +1,138 @@
+import numpy as np
+
+
+class RateCube:
+    """Dense (location x year x sex x cause) float32 array of GBD rates.
+
+    Built once from the long-format rate table. ``present`` marks the cells
+    that had at least one row in the source table so that endpoints can
+    still tell "no data" apart from a rate of zero.
+    """
+
+    AXES = ('location_id', 'year', 'sex_id', 'cause_id')
+
+    def __init__(self, location_ids, years, sex_ids, cause_ids, values, present):
+        self.location_ids = location_ids
+        self.years = years
+        self.sex_ids = sex_ids
+        self.cause_ids = cause_ids
+        self.values = values
+        self.present = present
+        self.location_index = {int(v): i for i, v in enumerate(location_ids)}
+        self.year_index = {int(v): i for i, v in enumerate(years)}
+        self.sex_index = {int(v): i for i, v in enumerate(sex_ids)}
+        self.cause_index = {int(v): i for i, v in enumerate(cause_ids)}
+        self.location_keys = [str(int(v)) for v in location_ids]
+        self.year_keys = [str(int(v)) for v in years]
+        self.sex_keys = [str(int(v)) for v in sex_ids]
+
+    @classmethod
+    def from_frame(cls, rate_data):
+        axes = [np.sort(rate_data[col].unique()).astype(np.int64) for col in cls.AXES]
+        shape = tuple(len(a) for a in axes)
+        positions = [np.searchsorted(a, rate_data[col].to_numpy()) for a, col in zip(axes, cls.AXES)]
+        flat = np.ravel_multi_index(positions, shape)
+        size = int(np.prod(shape))
+        values = np.bincount(flat, weights=rate_data['val'].to_numpy(dtype=np.float64), minlength=size)
+        values = values.astype(np.float32).reshape(shape)
+        present = np.zeros(size, dtype=bool)
+        present[flat] = True
+        return cls(*axes, values, present.reshape(shape))
+
+    def leaf_prefix_sums(self, hierarchy):
+        """Cumulative sums over the hierarchy's leaves in DFS order.
+
+        Any subtree, and any run of adjacent subtrees, is a contiguous
+        interval of that order, so its total for every location, year and
+        sex is the difference of two prefix entries. Sums are kept in
+        float64 because differences of float32 running totals would lose
+        the small causes.
+        """
+        leaf_idx = np.array([self.cause_index.get(c, -1) for c in hierarchy.leaf_order], dtype=np.intp)
+        in_cube = leaf_idx >= 0
+        rows = self.values.shape[:3]
+        leaf_values = np.zeros(rows + (len(leaf_idx),))
+        leaf_values[..., in_cube] = self.values[..., leaf_idx[in_cube]]
+        leaf_present = np.zeros(rows + (len(leaf_idx),), dtype=np.int32)
+        leaf_present[..., in_cube] = self.present[..., leaf_idx[in_cube]]
+        prefix = np.zeros(rows + (len(leaf_idx) + 1,))
+        np.cumsum(leaf_values, axis=3, out=prefix[..., 1:])
+        present_prefix = np.zeros(rows + (len(leaf_idx) + 1,), dtype=np.int32)
+        np.cumsum(leaf_present, axis=3, out=present_prefix[..., 1:])
+        return LeafPrefixCube(self, prefix, present_prefix)
+
+    @staticmethod
+    def _indices(index_map, ids):
+        return np.array([index_map[i] for i in dict.fromkeys(ids) if i in index_map], dtype=np.intp)
+
+    def locations(self, location_ids=None):
+        if location_ids is None:
+            return np.arange(len(self.location_ids))
+        return self._indices(self.location_index, location_ids)
+
+    def year_positions(self, years=None):
+        if years is None:
+            return np.arange(len(self.years))
+        return self._indices(self.year_index, years)
+
+    def sexes(self, sex_ids=None):
+        if sex_ids is None:
+            return np.arange(len(self.sex_ids))
+        return self._indices(self.sex_index, sex_ids)
+
+    def causes(self, cause_ids=None):
+        if cause_ids is None:
+            return np.arange(len(self.cause_ids))
+        return self._indices(self.cause_index, cause_ids)
+
+    def take_locations(self, locations):
+        """Copy of the cube restricted to the given location positions.
+
+        The year, sex and cause axes are unchanged, so positions from this
+        cube's index helpers are valid on the copy as well.
+        """
+        return RateCube(self.location_ids[locations], self.years, self.sex_ids, self.cause_ids, self.values[locations], self.present[locations])
+
+    def select(self, locations=None, years=None, sexes=None, causes=None):
+        """Return the ``(values, present)`` block for the given axis positions.
+
+        Each argument is an array of positions as returned by the index helpers
+        above; ``None`` keeps the whole axis. All four axes are kept, so callers
+        reduce with ``sum``/``any`` over the axes they do not report.
+        """
+        index = np.ix_(
+            self.locations() if locations is None else locations,
+            self.year_positions() if years is None else years,
+            self.sexes() if sexes is None else sexes,
+            self.causes() if causes is None else causes,
+        )
+        return self.values[index], self.present[index]
+
+
+class LeafPrefixCube:
+    """Prefix sums of a RateCube over hierarchy leaves, see ``leaf_prefix_sums``.
+
+    Shares the location, year and sex axes (and index helpers) of the cube it
+    was built from; the last axis is leaf position in DFS order plus one.
+    """
+
+    def __init__(self, cube, prefix, present_prefix):
+        self.cube = cube
+        self.prefix = prefix
+        self.present_prefix = present_prefix
+
+    def select(self, locations=None, years=None, sexes=None, causes=None):
+        """Like ``RateCube.select``, but ``causes`` is the ``(starts, ends)``
+        pair from ``CauseHierarchy.leaf_intervals`` and the last axis has one
+        slot per interval; callers reduce it the same way."""
+        starts, ends = causes
+        axes = (
+            self.cube.locations() if locations is None else locations,
+            self.cube.year_positions() if years is None else years,
+            self.cube.sexes() if sexes is None else sexes,
+        )
+        start_index = np.ix_(*axes, starts)
+        end_index = np.ix_(*axes, ends)
+        values = self.prefix[end_index] - self.prefix[start_index]
+        present = self.present_prefix[end_index] > self.present_prefix[start_index]
+        return values, present
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ResponseCache:
+    """Bounded LRU of serialized JSON bodies keyed on a canonical query.
+
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or ``max_bytes`` is exceeded. Each entry keeps a strong ETag derived from
+    the body so repeated queries can be answered with 304 Not Modified.
+    Concurrent misses on the same key are coalesced, see ``get_or_build``.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_or_build(self, key, build):
+        """Return the entry for ``key``, calling ``build()`` for the body on a miss.
+
+        Only the first of several concurrent misses for a key runs ``build``;
+        the others wait on its future and get the same entry (or exception).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            entry = self.put(key, build())
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        future.set_result(entry)
+        return entry
+
+    def put(self, key, body):
+        entry = (body, hashlib.sha1(body).hexdigest())
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._entries[key] = entry
+            self.bytes += len(body)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+        return entry
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key satisfies ``predicate``."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                body, _ = self._entries.pop(key)
+                self.bytes -= len(body)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "max_entries": self.max_entries, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,62 @@
+"""
+Production launcher for the Interactive Platform.
+
+The rate data is loaded once in the parent process (from the memory-mapped
+snapshot written by app.py) and then N gunicorn workers are forked from it,
+so every worker reads the same physical pages instead of holding its own
+copy. Run from anywhere:
+    python serve.py --workers 4 --bind 127.0.0.1:5000
+The worker count can also be set with INTERACTIVE_PLATFORM_WORKERS.
+"""
+
+import argparse
+import os
+import sys
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+
+DEFAULT_WORKERS = int(os.environ.get('INTERACTIVE_PLATFORM_WORKERS', os.cpu_count() or 1))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker (default: %(default)s)')
+    parser.add_argument('--bind', default='127.0.0.1:5000', help='address to listen on (default: %(default)s)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Importing app loads (or rebuilds) the snapshot before any worker forks.
+    from app import app, start_background_tasks
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is not installed (it is also unavailable on Windows); "
+              "falling back to a single threaded process.", file=sys.stderr)
+        host, _, port = args.bind.rpartition(':')
+        start_background_tasks()
+        app.run(host=host or '127.0.0.1', port=int(port), threaded=True)
+        return
+
+    class PreloadedApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', args.bind)
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('preload_app', True)
+            # Threads do not survive fork, so every worker warms its own
+            # response cache (see /api/ready) and watches for reloads.
+            self.cfg.set('post_fork', lambda server, worker: start_background_tasks())
+
+        def load(self):
+            return app
+
+    PreloadedApplication().run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from rate_cube import LeafPrefixCube, RateCube
+
+SNAPSHOT_FORMAT = 2
+MANIFEST_NAME = 'current.json'
+CUBE_ARRAYS = ('location_ids', 'years', 'sex_ids', 'cause_ids', 'values', 'present')
+# Leaf prefix sums of the cube (see RateCube.leaf_prefix_sums), so workers
+# map them from the snapshot instead of each recomputing them.
+PREFIX_ARRAYS = ('prefix', 'present_prefix')
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprints(paths, known=None):
+    """Content hashes of the source files, reusing ``known`` hashes when the
+    size and mtime of a file have not changed since they were recorded."""
+    known = known or {}
+    fingerprints = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        previous = known.get(path)
+        if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            sha256 = previous['sha256']
+        else:
+            sha256 = file_sha256(path)
+        fingerprints[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+    return fingerprints
+
+
+def data_version(fingerprints):
+    digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+    for path in sorted(fingerprints):
+        digest.update(fingerprints[path]['sha256'].encode())
+    return digest.hexdigest()[:16]
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _matches(manifest, fingerprints):
+    # Like ``load``: sources missing from disk (a snapshot-only deploy)
+    # are not compared.
+    recorded = manifest['sources']
+    return all(fingerprints[path]['sha256'] == recorded.get(path, {}).get('sha256') for path in fingerprints)
+
+
+def current_version(directory, sources, known=None):
+    """Version ``load`` would return for the sources on disk, and their
+    fingerprints.
+
+    That is the version of the snapshot when every source present on disk
+    matches it, so a deploy without some sources keeps its version, and
+    otherwise the version a rebuild would get. Hashes recorded in the
+    manifest (or passed as ``known``) are reused for files whose size and
+    mtime did not change, so polling this is cheap.
+    """
+    manifest = _read_manifest(directory)
+    if manifest and manifest.get('format') != SNAPSHOT_FORMAT:
+        manifest = None
+    if known is None:
+        known = (manifest or {}).get('sources')
+    fingerprints = source_fingerprints(sources, known)
+    if manifest and _matches(manifest, fingerprints):
+        return manifest['version'], fingerprints
+    return data_version(fingerprints), fingerprints
+
+
+def _write_json(path, obj):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def load(directory, sources):
+    """Load the snapshot in ``directory`` if it was built from ``sources``.
+
+    Returns ``(disease_hierarchy, location_dict, rate_cube, leaf_prefix,
+    version)`` or ``None`` when there is no snapshot or any source file that
+    is present on disk has different content. The cube and prefix arrays are
+    memory-mapped, so pages are only read from disk when a request touches
+    them.
+    """
+    manifest = _read_manifest(directory)
+    if not manifest or manifest.get('format') != SNAPSHOT_FORMAT:
+        return None
+    recorded = manifest['sources']
+    current = source_fingerprints(sources, recorded)
+    if not _matches(manifest, current):
+        return None
+    snapshot_dir = os.path.join(directory, manifest['version'])
+    try:
+        with open(os.path.join(snapshot_dir, 'hierarchy.json')) as f:
+            disease_hierarchy = json.load(f)
+        with open(os.path.join(snapshot_dir, 'locations.json')) as f:
+            location_dict = {int(k): v for k, v in json.load(f).items()}
+        arrays = {name: np.asarray(np.load(os.path.join(snapshot_dir, f'{name}.npy'), mmap_mode='r')) for name in CUBE_ARRAYS + PREFIX_ARRAYS}
+    except (OSError, ValueError):
+        return None
+    if current != {path: recorded[path] for path in current}:
+        # Same content but touched files: remember the new stats so the next
+        # start does not hash them again.
+        _write_json(os.path.join(directory, MANIFEST_NAME), {**manifest, 'sources': {**recorded, **current}})
+    rate_cube = RateCube(*(arrays[name] for name in CUBE_ARRAYS))
+    leaf_prefix = LeafPrefixCube(rate_cube, *(arrays[name] for name in PREFIX_ARRAYS))
+    return disease_hierarchy, location_dict, rate_cube, leaf_prefix, manifest['version']
+
+
+def save(directory, sources, disease_hierarchy, location_dict, rate_cube, leaf_prefix):
+    """Write a new versioned snapshot and point the manifest at it."""
+    fingerprints = source_fingerprints(sources)
+    version = data_version(fingerprints)
+    snapshot_dir = os.path.join(directory, version)
+    # Per process, since every worker of serve.py may rebuild after a reload.
+    tmp_dir = f"{snapshot_dir}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    with open(os.path.join(tmp_dir, 'hierarchy.json'), 'w') as f:
+        json.dump(disease_hierarchy, f)
+    with open(os.path.join(tmp_dir, 'locations.json'), 'w') as f:
+        json.dump({str(k): v for k, v in location_dict.items()}, f)
+    for name in CUBE_ARRAYS:
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(getattr(rate_cube, name)))
+    for name in PREFIX_ARRAYS:
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(getattr(leaf_prefix, name)))
+    files = {entry: file_sha256(os.path.join(tmp_dir, entry)) for entry in sorted(os.listdir(tmp_dir))}
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, snapshot_dir)
+    except OSError:
+        # Another process published the same version in the meantime.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _write_json(os.path.join(directory, MANIFEST_NAME), {'format': SNAPSHOT_FORMAT, 'version': version, 'sources': fingerprints, 'files': files})
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry != version and '.tmp' not in entry and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return version
@@ -30,22 +30,76 @@ function parseUrlParams() {
 document.addEventListener('DOMContentLoaded', function() {
     parseUrlParams();
     
+    // Metadata as plain versioned GETs, which the browser caches for good;
+    // only the per-country queries go through the batch.
     Promise.all([
-        d3.json('/api/diseases'),
-        d3.json('/api/locations'),
-        d3.json('/api/years')
-    ]).then(([diseases, locations, years]) => {
+        d3.json(`/api/diseases?v=${dataVersion}`),
+        d3.json(`/api/locations?v=${dataVersion}`),
+        d3.json(`/api/years?v=${dataVersion}`),
+        fetchBatch(diseaseDataQueries())
+    ]).then(([diseases, locations, years, [level1Data, similarCountries]]) => {
         diseaseHierarchy = diseases;
         locationData = locations;
         availableYears = years;
         extractLevel1Diseases(diseaseHierarchy.causes);
         initializeSexFilter();
         initializeDiseaseTree();
-        loadDiseaseData();
+        level1DiseaseData = level1Data;
+        createLineChart();
+        renderSimilarCountries(similarCountries);
         setupBackButton();
     }).catch(error => console.error('Error loading data:', error));
 });
 
+function fetchBatch(queries) {
+    return d3.json('/api/batch', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({queries: queries})
+    }).then(response => {
+        if (response.error) {
+            throw new Error(response.error);
+        }
+        return response.results.map(result => result.data);
+    });
+}
+
+function diseaseDataParams() {
+    return {
+        location: locationId,
+        diseases: Array.from(selectedDiseases).join(','),
+        sexes: Array.from(selectedSexes).join(',')
+    };
+}
+
+function diseaseDataQueries() {
+    return [
+        {path: '/api/disease-rates-by-level1', params: diseaseDataParams()},
+        {path: '/api/similar-countries', params: diseaseDataParams()}
+    ];
+}
+
+function renderSimilarCountries(similarCountries) {
+    const container = d3.select('#similar-countries');
+    container.html('');
+    if (!Array.isArray(similarCountries) || similarCountries.length === 0) {
+        container.append('div').attr('class', 'similar-empty').text('No comparable countries for this selection');
+        return;
+    }
+    const params = `diseases=${Array.from(selectedDiseases).join(',')}&sexes=${Array.from(selectedSexes).join(',')}`;
+    const items = container.append('ol')
+        .selectAll('li')
+        .data(similarCountries)
+        .enter()
+        .append('li');
+    items.append('a')
+        .attr('href', d => `/country/${d.location_id}?${params}`)
+        .text(d => d.name);
+    items.append('span')
+        .attr('class', 'similar-score')
+        .text(d => ` (r = ${d.correlation.toFixed(2)})`);
+}
+
 function extractLevel1Diseases(causes) {
     causes.forEach(cause => {
         if (cause.cause && cause.cause.length === 1) {
@@ -167,13 +221,10 @@ function removeDiseaseAndChildren(disease) {
 function loadDiseaseData() {
     d3.select('#line-chart-container')
         .html('<div class="loading-indicator">Loading disease data...</div>');
-    const diseases = Array.from(selectedDiseases).join(',');
-    const sexes = Array.from(selectedSexes).join(',');
-    const url = `/api/disease-rates-by-level1?location=${locationId}&diseases=${diseases}&sexes=${sexes}`;
-    
-    d3.json(url).then(data => {
-        level1DiseaseData = data;
+    fetchBatch(diseaseDataQueries()).then(([level1Data, similarCountries]) => {
+        level1DiseaseData = level1Data;
         createLineChart();
+        renderSimilarCountries(similarCountries);
     }).catch(error => {
         console.error('Error loading disease data:', error);
         d3.select('#line-chart-container')
@@ -31,8 +31,8 @@ document.addEventListener('DOMContentLoaded', function() {
     parseUrlParams();
     
     Promise.all([
-        d3.json('/api/diseases'),
-        d3.json('/api/locations')
+        d3.json(`/api/diseases?v=${dataVersion}`),
+        d3.json(`/api/locations?v=${dataVersion}`)
     ]).then(([diseases, locations]) => {
         diseaseHierarchy = diseases;
         locationData = locations;
@@ -158,7 +158,8 @@ function loadDrilldownData(diseaseId) {
     updateBackButton();
     updateChartTitle();
     const sexParams = Array.from(selectedSexes).join(',');
-    const url = `/api/disease_children?parent_id=${diseaseId}&year=${currentYear}&location_id=${locationId}&sexes=${sexParams}`;
+    const diseaseParams = Array.from(selectedDiseases).join(',');
+    const url = `/api/disease_children?parent_id=${diseaseId}&year=${currentYear}&location_id=${locationId}&diseases=${diseaseParams}&sexes=${sexParams}`;
     
     d3.json(url)
         .then(data => {
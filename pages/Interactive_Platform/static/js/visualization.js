@@ -15,7 +15,7 @@ let isDataLoading = false;
 let countryHistoryCache = {};
 
 document.addEventListener('DOMContentLoaded', function() {
-    Promise.all([d3.json('/api/diseases'),d3.json('/api/locations'),d3.json('/api/years'),d3.json('https://cdn.jsdelivr.net/npm/world-atlas@2/countries-110m.json')])
+    Promise.all([d3.json(`/api/diseases?v=${dataVersion}`),d3.json(`/api/locations?v=${dataVersion}`),d3.json(`/api/years?v=${dataVersion}`),d3.json(worldMapUrl)])
     .then(([diseases, locations, years, world]) => {
         diseaseHierarchy = diseases;
         locationData = locations;
@@ -144,28 +144,67 @@ function createLineGraph(data, container, width, height) {
         .style('font-size', '8px');
 }
 
-async function loadAllYearsData() {
+// Resolves as soon as the first year has arrived; the remaining years keep
+// streaming into the cache entry while the animation is already running.
+function loadAllYearsData() {
     const selectionKey = getSelectionKey();
     
     if (allYearsDataCache[selectionKey]) {
-        return allYearsDataCache[selectionKey];
+        return Promise.resolve(allYearsDataCache[selectionKey]);
     }
     
     setLoadingState(true);
     
-    try {
-        const diseases = Array.from(selectedDiseases).join(',');
-        const sexes = Array.from(selectedSexes).join(',');
-        
-        const url = `/api/all-years-data?diseases=${diseases}&sexes=${sexes}`;
-        const response = await d3.json(url);
-        allYearsDataCache[selectionKey] = response;
-        return response;
-    } catch (error) {
-        console.error('Error fetching all years data:', error);
-        return null;
-    } finally {
-        setLoadingState(false);
+    const diseases = Array.from(selectedDiseases).join(',');
+    const sexes = Array.from(selectedSexes).join(',');
+    const url = `/api/all-years-data/stream?diseases=${diseases}&sexes=${sexes}`;
+    const entry = {yearData: {}, statistics: {}};
+    allYearsDataCache[selectionKey] = entry;
+    
+    return new Promise(resolve => {
+        let resolved = false;
+        const firstFrame = () => {
+            if (resolved) return;
+            resolved = true;
+            setLoadingState(false);
+            resolve(entry);
+        };
+        streamAllYearsData(url, entry, firstFrame)
+            .then(firstFrame)
+            .catch(error => {
+                console.error('Error fetching all years data:', error);
+                if (allYearsDataCache[selectionKey] === entry) {
+                    delete allYearsDataCache[selectionKey];
+                }
+                if (!resolved) {
+                    resolved = true;
+                    setLoadingState(false);
+                    resolve(null);
+                }
+            });
+    });
+}
+
+async function streamAllYearsData(url, entry, onFrame) {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const {done, value} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line).forEach(line => {
+            const frame = JSON.parse(line);
+            entry.yearData[frame.year] = frame.data;
+            entry.statistics[frame.year] = frame.statistics;
+            onFrame();
+        });
     }
 }
 
@@ -303,11 +342,11 @@ function initializeMap() {
         .append('svg')
         .attr('width', width)
         .attr('height', height);
-    const projection = d3.geoNaturalEarth1()
-        .scale(width / 2 / Math.PI)
-        .translate([width / 2, height / 2]);
-    const path = d3.geoPath()
-        .projection(projection);
+    // The country paths come pre-projected (Natural Earth, unit scale times
+    // worldData.scale); scale and centre them like the d3 projection would.
+    const zoomLayer = svg.append('g');
+    const mapLayer = zoomLayer.append('g')
+        .attr('transform', `translate(${width / 2},${height / 2}) scale(${width / 2 / Math.PI / worldData.scale})`);
     let tooltip = d3.select('#tooltip');
     if (tooltip.empty()) {
         tooltip = d3.select('body').append('div')
@@ -315,33 +354,18 @@ function initializeMap() {
             .attr('class', 'tooltip')
             .style('opacity', 0);
     }
-    const countries = topojson.feature(worldData, worldData.objects.countries).features;
-    const locationIdToName = {};
-    for (const [id, name] of Object.entries(locationData)) {
-        locationIdToName[id] = name;
-    }
-    const countryToLocationId = {};
-    countries.forEach(country => {
-        for (const [locId, locName] of Object.entries(locationData)) {
-            if (country.properties.name && locName &&
-                (country.properties.name.toLowerCase().includes(locName.toLowerCase()) || 
-                 locName.toLowerCase().includes(country.properties.name.toLowerCase()))) {
-                countryToLocationId[country.id] = locId;
-                break;
-            }
-        }
-    });
-    
-    svg.selectAll('path')
-        .data(countries)
+    mapLayer.selectAll('path')
+        .data(worldData.countries)
         .enter()
         .append('path')
-        .attr('d', path)
+        .attr('d', d => d.path)
         .attr('class', 'country')
         .attr('fill', '#ccc')
+        .attr('fill-rule', 'evenodd')
         .attr('stroke', '#fff')
         .attr('stroke-width', 0.5)
-        .attr('data-id', d => countryToLocationId[d.id])
+        .attr('vector-effect', 'non-scaling-stroke')
+        .attr('data-id', d => d.location_id)
         .on('click', function(event, d) {
             const locationId = d3.select(this).attr('data-id');
             if (!locationId) return;
@@ -352,7 +376,7 @@ function initializeMap() {
         })
 
         .on('mouseover', async function(event, d) {
-            const locationId = countryToLocationId[d.id];
+            const locationId = d.location_id;
             if (!locationId) return;
             
             const countryName = locationData[locationId];
@@ -406,8 +430,7 @@ function initializeMap() {
     const zoom = d3.zoom()
         .scaleExtent([1, 8])
         .on('zoom', (event) => {
-            svg.selectAll('path')
-                .attr('transform', event.transform);
+            zoomLayer.attr('transform', event.transform);
         });
     
     svg.call(zoom);
@@ -671,13 +694,13 @@ async function updateMap() {
         return;
     }
     
-    const url = `/api/all-countries-rates?year=${currentYear}&diseases=${Array.from(selectedDiseases).join(',')}&sexes=${Array.from(selectedSexes).join(',')}`;
+    const url = `/api/all-countries-rates?year=${currentYear}&diseases=${Array.from(selectedDiseases).join(',')}&sexes=${Array.from(selectedSexes).join(',')}&format=binary`;
     
     try {
-        const data = await d3.json(url);
+        const decoded = decodeRateBlocks(await d3.buffer(url));
+        const data = decoded.yearData[currentYear] || {};
         countryRatesData = data;
-        const stats = data._statistics || { min: 0, max: 1 };
-        delete data._statistics;
+        const stats = decoded.statistics[currentYear] || { min: 0, max: 1 };
         updateLegend(stats.min, stats.max);
         colorScale = d3.scaleSequential(d3.interpolateYlOrRd)
             .domain([0, stats.max || 1]);
@@ -721,3 +744,33 @@ function updateMapWithYearData(year) {
                    colorScale(countryData.total) : '#ccc';
         });
 }
+
+// Decodes the binary rate blocks served with format=binary (see
+// rate_blocks.py) back into the {yearData, statistics} shape of the JSON API.
+function decodeRateBlocks(buffer) {
+    const view = new DataView(buffer);
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    const locationCount = header.locations;
+    const locationIds = new Int32Array(buffer, 8 + headerLength, locationCount);
+    const values = new Float32Array(buffer, 8 + headerLength + 4 * locationCount);
+    const columnCount = header.columns.length;
+    const yearData = {};
+    header.years.forEach((year, y) => {
+        const yearResult = {};
+        for (let l = 0; l < locationCount; l++) {
+            const offset = (y * locationCount + l) * columnCount;
+            let row = null;
+            for (let c = 0; c < columnCount; c++) {
+                const value = values[offset + c];
+                if (!Number.isNaN(value)) {
+                    row = row || {};
+                    row[header.columns[c]] = value;
+                }
+            }
+            if (row) yearResult[locationIds[l]] = row;
+        }
+        yearData[year] = yearResult;
+    });
+    return {yearData: yearData, statistics: header.statistics};
+}
@@ -0,0 +1,407 @@
+"""
+Endpoint tests against a small generated data set. Run from the repository
+root with:
+    python -m unittest discover -s pages/Interactive_Platform/tests
+"""
+
+import gzip
+import importlib
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import compression  # noqa: E402
+
+HIERARCHY = {"causes": [
+    {"id": 295, "name": "Communicable", "cause": "A", "subcauses": [
+        {"id": 298, "name": "HIV/AIDS", "cause": "A.1"},
+    ]},
+    {"id": 409, "name": "Non-communicable", "cause": "B", "subcauses": [
+        {"id": 410, "name": "Neoplasms", "cause": "B.1"},
+    ]},
+]}
+
+LOCATIONS = {6: "China", 7: "North Korea", 20: "Vietnam", 30: "Chad", 102: "United States of America"}
+
+
+def rate_rows():
+    # 6 and 102: every year, sex and cause, rising over time.
+    for location_id in (6, 102):
+        for year in (2000, 2001):
+            for sex_id in (1, 2):
+                for cause_id in (298, 410):
+                    yield location_id, cause_id, sex_id, year, location_id + cause_id + sex_id + year / 1000
+    # 7: no data for 2001. 20: ties with 7 in 2000 and is flat over time.
+    for location_id, years in ((7, (2000,)), (20, (2000, 2001))):
+        for year in years:
+            yield location_id, 298, 1, year, 10
+            yield location_id, 298, 2, year, 20
+    # 30: males only, falling over time.
+    yield 30, 298, 1, 2000, 50
+    yield 30, 298, 1, 2001, 40
+
+
+app = None
+client = None
+work_dir = None
+start_dir = None
+
+
+def write_data(pages_dir):
+    data_dir = os.path.join(pages_dir, 'Interactive_Platform', 'data')
+    os.makedirs(data_dir)
+    with open(os.path.join(data_dir, 'filtered_hierarchical_causes.json'), 'w') as f:
+        json.dump(HIERARCHY, f)
+    shutil.copy(os.path.join(APP_DIR, 'data', 'countries-110m.geojson'), data_dir)
+    with open(os.path.join(pages_dir, 'location_mapping.csv'), 'w') as f:
+        f.write("location_id,location_name\n")
+        f.writelines(f"{location_id},{name}\n" for location_id, name in LOCATIONS.items())
+    with open(os.path.join(pages_dir, 'GBD.csv'), 'w') as f:
+        f.write("location_id,cause_id,sex_id,year,metric_name,val\n")
+        f.writelines(f"{location_id},{cause_id},{sex_id},{year},Rate,{val}\n" for location_id, cause_id, sex_id, year, val in rate_rows())
+    return os.path.dirname(data_dir)
+
+
+def setUpModule():
+    global app, client, work_dir, start_dir
+    start_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp()
+    # The app reads its files relative to its working directory.
+    os.chdir(write_data(os.path.join(work_dir, 'pages')))
+    app = importlib.import_module('app')
+    client = app.app.test_client()
+
+
+def tearDownModule():
+    os.chdir(start_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class DiseaseRatesByLevel1Test(unittest.TestCase):
+    URL = '/api/disease-rates-by-level1'
+
+    def test_known_location(self):
+        data = client.get(self.URL, query_string={'location': 6, 'diseases': 295}).get_json()
+        self.assertEqual(list(data), ['295'])
+        self.assertEqual(sorted(data['295']['data']), ['2000', '2001'])
+
+    def test_unknown_location(self):
+        response = client.get(self.URL, query_string={'location': 999, 'diseases': 295})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {})
+
+    def test_unknown_location_in_batch(self):
+        queries = [{'path': self.URL, 'params': {'location': 999, 'diseases': '295'}}]
+        result = client.post('/api/batch', json={'queries': queries}).get_json()['results'][0]
+        self.assertEqual((result['status'], result['data']), (200, {}))
+
+
+class BatchTest(unittest.TestCase):
+    def batch(self, *queries):
+        return client.post('/api/batch', json={'queries': list(queries)}).get_json()['results']
+
+    def test_failing_query_keeps_the_others(self):
+        with self.assertLogs(app.app.logger, 'ERROR'):
+            failing, years = self.batch({'path': '/api/all-countries-rates', 'params': {'year': 'x'}}, {'path': '/api/years'})
+        self.assertEqual(failing['status'], 500)
+        self.assertIn('error', failing['data'])
+        self.assertEqual((years['status'], years['data']), (200, [2000, 2001]))
+
+    def test_unknown_path_is_not_found(self):
+        (result,) = self.batch({'path': '/api/no-such-endpoint'})
+        self.assertEqual(result['status'], 404)
+
+    def test_non_json_endpoint_rejected(self):
+        (result,) = self.batch({'path': '/api/all-countries-rates', 'params': {'format': 'binary'}})
+        self.assertEqual(result['status'], 400)
+
+
+class TopCountriesTest(unittest.TestCase):
+    URL = '/api/top-countries'
+
+    def ranking(self, **query):
+        return client.get(self.URL, query_string=query).get_json()
+
+    def test_each_year_ranked_on_its_own(self):
+        data = self.ranking(n=3)
+        self.assertEqual(list(data), ['2000', '2001'])
+        self.assertEqual([r['location_id'] for r in data['2000']], [102, 6, 30])
+        self.assertEqual([r['location_id'] for r in data['2001']], [102, 6, 30])
+        first = data['2000'][0]
+        self.assertEqual(first['name'], "United States of America")
+        self.assertAlmostEqual(first['total'], first['1'] + first['2'])
+
+    def test_n_larger_than_the_locations_with_data(self):
+        data = self.ranking(n=50)
+        # 7 has no 2001 data, so it is left out rather than ranked last.
+        self.assertEqual(len(data['2000']), 5)
+        self.assertEqual(sorted(r['location_id'] for r in data['2001']), [6, 20, 30, 102])
+        for ranking in data.values():
+            totals = [r['total'] for r in ranking]
+            self.assertEqual(totals, sorted(totals, reverse=True))
+
+    def test_ties(self):
+        ranking = self.ranking(year=2000, n=5)['2000']
+        self.assertEqual({r['location_id'] for r in ranking[3:]}, {7, 20})
+        self.assertEqual(ranking[3]['total'], ranking[4]['total'])
+        cut = self.ranking(year=2000, n=4)['2000']
+        self.assertIn(cut[3]['location_id'], {7, 20})
+        self.assertEqual(cut[3]['total'], 30)
+
+    def test_year_and_sex_filters(self):
+        data = self.ranking(year=2001, sexes='2', diseases='298', n=10)
+        self.assertEqual(list(data), ['2001'])
+        # 30 has no female rows.
+        self.assertEqual([r['location_id'] for r in data['2001']], [102, 6, 20])
+        self.assertEqual([set(r) - {'location_id', 'name', 'total'} for r in data['2001']], [{'2'}] * 3)
+        self.assertEqual(data['2001'][2]['total'], 20)
+
+    def test_year_range(self):
+        self.assertEqual(list(self.ranking(start_year=2001, end_year=2001)), ['2001'])
+
+    def test_invalid_parameters(self):
+        self.assertIn('error', self.ranking(n=0))
+        self.assertIn('error', self.ranking(n='x'))
+
+
+class SimilarCountriesTest(unittest.TestCase):
+    URL = '/api/similar-countries'
+
+    def similar(self, **query):
+        return client.get(self.URL, query_string=query).get_json()
+
+    def test_ranked_by_correlation_without_the_query_country(self):
+        result = self.similar(location=6)
+        # 20 is flat (zero std) and 7 misses a year, so neither can be compared.
+        self.assertEqual([r['location_id'] for r in result], [102, 30])
+        closest, opposite = result
+        self.assertAlmostEqual(closest['correlation'], 1)
+        self.assertAlmostEqual(closest['distance'], 0)
+        self.assertAlmostEqual(opposite['correlation'], -1)
+        self.assertAlmostEqual(opposite['distance'], math.sqrt(8))
+        self.assertEqual(closest['name'], "United States of America")
+
+    def test_k(self):
+        self.assertEqual([r['location_id'] for r in self.similar(location=6, k=1)], [102])
+
+    def test_constant_trajectory(self):
+        self.assertEqual(self.similar(location=20), [])
+
+    def test_incomplete_trajectory(self):
+        self.assertEqual(self.similar(location=7), [])
+
+    def test_unknown_location(self):
+        self.assertEqual(self.similar(location=999), [])
+
+    def test_selection_changes_the_trajectories(self):
+        # Females only: 30 has no data at all and 20 is still flat.
+        self.assertEqual([r['location_id'] for r in self.similar(location=6, sexes='2')], [102])
+
+    def test_missing_or_invalid_location(self):
+        self.assertIn('error', self.similar())
+        self.assertIn('error', self.similar(location='x'))
+
+
+def decode_rate_blocks(body):
+    """The GBDR layout, read by hand rather than with rate_blocks.decode."""
+    magic, header_length = struct.unpack_from('<4sI', body)
+    assert magic == b'GBDR' and header_length % 4 == 0
+    header = json.loads(body[8:8 + header_length])
+    offset = 8 + header_length
+    location_ids = np.frombuffer(body, dtype='<i4', count=header['locations'], offset=offset)
+    offset += location_ids.nbytes
+    table = np.frombuffer(body, dtype='<f4', offset=offset)
+    return header, location_ids, table.reshape(len(header['years']), header['locations'], len(header['columns']))
+
+
+class RateBlocksTest(unittest.TestCase):
+    def blocks_and_json(self, url, **query):
+        binary = client.get(url, query_string={**query, 'format': 'binary'})
+        self.assertEqual(binary.mimetype, 'application/x-gbd-rate-blocks')
+        return decode_rate_blocks(binary.get_data()), client.get(url, query_string=query).get_json()
+
+    def assert_rows_match(self, columns, location_ids, rows, expected):
+        for location_id, row in zip(location_ids.tolist(), rows):
+            values = {column: value for column, value in zip(columns, row.tolist()) if not math.isnan(value)}
+            json_values = expected.get(str(location_id), {})
+            self.assertEqual(set(values), set(json_values), location_id)
+            for column, value in values.items():
+                self.assertAlmostEqual(value, json_values[column], places=2)
+
+    def test_single_year_matches_json(self):
+        (header, location_ids, table), expected = self.blocks_and_json('/api/all-countries-rates', year=2001, sexes='1,2')
+        self.assertEqual(header['version'], 1)
+        self.assertEqual(header['years'], ['2001'])
+        self.assertEqual(header['columns'], ['total', '1', '2'])
+        self.assertEqual(sorted(location_ids.tolist()), sorted(LOCATIONS))
+        statistics = expected.pop('_statistics')
+        for key in statistics:
+            self.assertAlmostEqual(header['statistics']['2001'][key], statistics[key], places=2)
+        self.assert_rows_match(header['columns'], location_ids, table[0], expected)
+
+    def test_all_years_matches_json(self):
+        (header, location_ids, table), expected = self.blocks_and_json('/api/all-years-data', diseases='298', sexes='1,2')
+        self.assertEqual(header['years'], sorted(expected['yearData']))
+        for year, rows in zip(header['years'], table):
+            self.assert_rows_match(header['columns'], location_ids, rows, expected['yearData'][year])
+            for key, value in expected['statistics'][year].items():
+                self.assertAlmostEqual(header['statistics'][year][key], value, places=2)
+
+    def test_accept_header_selects_the_format(self):
+        response = client.get('/api/all-countries-rates', query_string={'year': 2000}, headers={'Accept': 'application/x-gbd-rate-blocks'})
+        self.assertEqual(response.get_data()[:4], b'GBDR')
+        self.assertIn('Accept', response.vary)
+
+
+class CompressionTest(unittest.TestCase):
+    URL = '/api/all-years-data'
+
+    def setUp(self):
+        # The test bodies are small; compress them all unless a test says otherwise.
+        self.min_size = app.app.config['COMPRESS_MIN_SIZE']
+        app.app.config['COMPRESS_MIN_SIZE'] = 0
+
+    def tearDown(self):
+        app.app.config['COMPRESS_MIN_SIZE'] = self.min_size
+
+    def get(self, url=URL, encoding=None, **headers):
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+        return client.get(url, query_string={'sexes': '1,2'}, headers=headers)
+
+    def test_gzip(self):
+        plain, compressed = self.get(), self.get(encoding='gzip')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.get_data()), plain.get_data())
+        self.assertIn('Accept-Encoding', compressed.vary)
+
+    @unittest.skipUnless(compression.brotli, "brotli is not installed")
+    def test_brotli_preferred(self):
+        plain, compressed = self.get(), self.get(encoding='gzip, br')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(compressed.get_data()), plain.get_data())
+
+    def test_identity(self):
+        for response in (self.get(), self.get(encoding='identity')):
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertIn('Accept-Encoding', response.vary)
+            json.loads(response.get_data())
+
+    def test_small_bodies_left_alone(self):
+        app.app.config['COMPRESS_MIN_SIZE'] = 1 << 20
+        self.assertNotIn('Content-Encoding', self.get(encoding='gzip').headers)
+
+    def test_weak_etag_still_revalidates(self):
+        plain, compressed = self.get(), self.get(encoding='gzip')
+        etag, weak = plain.get_etag()
+        self.assertFalse(weak)
+        self.assertEqual(compressed.get_etag(), (etag, True))
+        for headers in ({'If-None-Match': compressed.headers['ETag']}, {'If-None-Match': plain.headers['ETag']}):
+            self.assertEqual(self.get(encoding='gzip', **headers).status_code, 304)
+
+    def test_precompressed_body_not_encoded_twice(self):
+        plain, compressed = self.get('/api/diseases'), self.get('/api/diseases', encoding='gzip')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.get_data()), plain.get_data())
+        self.assertEqual(compressed.get_etag(), (plain.get_etag()[0] + '-gzip', False))
+
+    def test_static_files_passed_through(self):
+        response = self.get('/static/js/visualization.js', encoding='gzip')
+        self.assertNotIn('Content-Encoding', response.headers)
+        response.close()
+
+    def test_streamed_frames_flushed_one_by_one(self):
+        # A selection nothing has cached yet, so the body is really streamed.
+        # Streams are compressed whatever their size.
+        app.app.config['COMPRESS_MIN_SIZE'] = 1 << 20
+        response = client.get('/api/all-years-data/stream', query_string={'diseases': '410', 'sexes': '1'}, headers={'Accept-Encoding': 'gzip'}, buffered=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        chunks = list(response.response)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        first = decompressor.decompress(chunks[0])
+        self.assertEqual(json.loads(first)['year'], '2000')
+        rest = b''.join(decompressor.decompress(chunk) for chunk in chunks[1:])
+        self.assertEqual([json.loads(line)['year'] for line in (first + rest).splitlines()], ['2000', '2001'])
+
+
+class AllYearsStreamTest(unittest.TestCase):
+    URL = '/api/all-years-data/stream'
+
+    def test_frames_match_all_years_data(self):
+        query = {'diseases': '298', 'sexes': '1,2'}
+        frames = [json.loads(line) for line in client.get(self.URL, query_string=query).get_data().splitlines()]
+        expected = client.get('/api/all-years-data', query_string=query).get_json()
+        self.assertEqual({f['year']: f['data'] for f in frames}, expected['yearData'])
+        self.assertEqual({f['year']: f['statistics'] for f in frames}, expected['statistics'])
+
+    def test_cold_selection_streams_then_is_cached(self):
+        # Only one sex, which the warm-up never builds.
+        query = {'diseases': '410', 'sexes': '2'}
+        cold = client.get(self.URL, query_string=query, buffered=False)
+        # Sent as it is reduced, not buffered to learn its length first.
+        self.assertNotIn('Content-Length', cold.headers)
+        self.assertIsNone(cold.headers.get('ETag'))
+        body = cold.get_data()
+        warm = client.get(self.URL, query_string=query)
+        self.assertEqual(warm.get_data(), body)
+        self.assertIsNotNone(warm.headers.get('ETag'))
+
+    def test_served_from_warmed_cache(self):
+        app.current_release.warm_up.run()
+        hits = app.response_cache.hits
+        response = client.get(self.URL, query_string={'sexes': '1,2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app.response_cache.hits, hits + 1)
+        again = client.get(self.URL, query_string={'sexes': '1,2'}, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_prefix_sums_are_mapped_from_the_snapshot(self):
+        current = app.current_release
+        for array in (current.leaf_prefix.prefix, current.leaf_prefix.present_prefix):
+            self.assertIsInstance(array.base, np.memmap)
+        rebuilt = current.rate_cube.leaf_prefix_sums(current.cause_hierarchy)
+        np.testing.assert_array_equal(current.leaf_prefix.prefix, rebuilt.prefix)
+        np.testing.assert_array_equal(current.leaf_prefix.present_prefix, rebuilt.present_prefix)
+
+    def test_manifest_records_every_file(self):
+        with open(os.path.join(app.SNAPSHOT_DIR, app.snapshot.MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        snapshot_dir = os.path.join(app.SNAPSHOT_DIR, manifest['version'])
+        self.assertEqual(sorted(manifest['files']), sorted(os.listdir(snapshot_dir)))
+        self.assertEqual(manifest['files']['prefix.npy'], app.snapshot.file_sha256(os.path.join(snapshot_dir, 'prefix.npy')))
+
+
+class ReloadTest(unittest.TestCase):
+    def test_snapshot_only_deploy_keeps_its_version(self):
+        os.rename(app.GBD_PATH, app.GBD_PATH + '.moved')
+        try:
+            version, _ = app.snapshot.current_version(app.SNAPSHOT_DIR, app.SOURCE_PATHS)
+            self.assertEqual(version, app.current_release.version)
+            self.assertFalse(app.reload_release())
+        finally:
+            os.rename(app.GBD_PATH + '.moved', app.GBD_PATH)
+
+    def test_admin_needs_a_configured_token(self):
+        self.assertEqual(client.get('/api/admin/reload').status_code, 403)
+
+    def test_admin_not_reachable_through_batch(self):
+        queries = [{'path': '/api/admin/reload'}]
+        result = client.post('/api/batch', json={'queries': queries}).get_json()['results'][0]
+        self.assertEqual(result['status'], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache
+
+
+class EvictionTest(unittest.TestCase):
+    def test_byte_cap_evicts_least_recently_used(self):
+        cache = ResponseCache(max_entries=10, max_bytes=10)
+        cache.put('a', b'aaaa')
+        cache.put('b', b'bbbb')
+        cache.get('a')
+        cache.put('c', b'cccc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')[0], b'aaaa')
+        self.assertEqual(cache.get('c')[0], b'cccc')
+        self.assertEqual((cache.bytes, cache.evictions), (8, 1))
+
+    def test_entry_cap_evicts_least_recently_used(self):
+        cache = ResponseCache(max_entries=2, max_bytes=100)
+        for key in 'abc':
+            cache.put(key, key.encode())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('a'))
+
+    def test_body_over_the_byte_cap_is_not_kept(self):
+        cache = ResponseCache(max_entries=10, max_bytes=4)
+        cache.put('a', b'aaa')
+        body, etag = cache.put('big', b'bigger')
+        self.assertEqual(body, b'bigger')
+        self.assertIsNone(cache.get('big'))
+        self.assertEqual(cache.get('a')[0], b'aaa')
+
+    def test_discard_where(self):
+        cache = ResponseCache()
+        cache.put(('old', 1), b'x')
+        cache.put(('new', 1), b'yy')
+        cache.discard_where(lambda key: key[0] == 'old')
+        self.assertEqual((len(cache), cache.bytes), (1, 2))
+
+
+class CoalescingTest(unittest.TestCase):
+    def test_concurrent_misses_build_once(self):
+        cache = ResponseCache()
+        calls = []
+        started = threading.Event()
+
+        def build():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return b'body'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_build('k', build))) for _ in range(8)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual((cache.misses, cache.coalesced), (1, 7))
+
+    def test_failed_build_reaches_waiters_and_is_retried(self):
+        cache = ResponseCache()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.2)
+            raise ValueError("build failed")
+
+        errors = []
+
+        def request():
+            try:
+                cache.get_or_build('k', fail)
+            except ValueError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=request) for _ in range(3)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(cache.get_or_build('k', lambda: b'ok')[0], b'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
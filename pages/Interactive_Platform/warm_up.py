@@ -0,0 +1,60 @@
+import contextvars
+import threading
+import time
+
+
+class WarmUp:
+    """Runs a list of ``(name, task)`` callables once, in a background thread
+    or in the caller's.
+
+    Tasks run in a copy of the context the WarmUp was created in. Progress
+    can be read at any time from ``status()``; a failing task is recorded
+    and skipped so one bad selection does not keep the process from ever
+    becoming ready.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+        self.done = 0
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+        self._context = contextvars.copy_context()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or self.started_at is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+            self._thread.start()
+
+    def run(self):
+        self.started_at = time.time()
+        self._context.run(self._run)
+
+    def _run(self):
+        for name, task in self.tasks:
+            try:
+                task()
+            except Exception as exc:
+                self.errors.append({'task': name, 'error': repr(exc)})
+            self.done += 1
+        self.finished_at = time.time()
+
+    @property
+    def ready(self):
+        return self.finished_at is not None
+
+    def status(self):
+        if self.started_at is None:
+            state = 'pending'
+        elif self.ready:
+            state = 'ready'
+        else:
+            state = 'running'
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {'state': state, 'done': self.done, 'total': len(self.tasks), 'errors': list(self.errors), 'seconds': elapsed}
@@ -0,0 +1,99 @@
+"""
+Country shapes for the map view, built once at startup from the bundled
+Natural Earth 1:110m countries (data/countries-110m.geojson).
+
+Rings are projected with d3's Natural Earth projection at unit scale (y
+pointing down, as on screen), quantized to 1/SCALE units and written as
+relative SVG path data, so the browser only has to scale and translate
+them. Each country is joined to its GBD location id here instead of by
+name matching in the browser.
+"""
+
+import json
+
+import numpy as np
+
+SCALE = 1000
+
+
+def natural_earth(lon, lat):
+    """d3.geoNaturalEarth1 raw projection of degrees, with y flipped."""
+    lam, phi = np.radians(lon), np.radians(lat)
+    phi2 = phi * phi
+    phi4 = phi2 * phi2
+    x = lam * (0.8707 - 0.131979 * phi2 + phi4 * (-0.013791 + phi4 * (0.003971 * phi2 - 0.001529 * phi4)))
+    y = phi * (1.007226 + phi2 * (0.015085 + phi4 * (-0.044475 + 0.028874 * phi2 - 0.005916 * phi4)))
+    return x, -y
+
+
+def _ring_points(ring):
+    coords = np.asarray(ring, dtype=np.float64)
+    x, y = natural_earth(coords[:, 0], coords[:, 1])
+    points = np.rint(np.column_stack([x, y]) * SCALE).astype(np.int64)
+    # Quantizing merges neighbouring vertices; keep one of each run and drop
+    # the closing vertex, the path closes the ring itself.
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (np.diff(points, axis=0) != 0).any(axis=1)
+    points = points[keep]
+    if len(points) > 1 and (points[0] == points[-1]).all():
+        points = points[:-1]
+    return points
+
+
+def _ring_path(points):
+    deltas = np.diff(points, axis=0).ravel().tolist()
+    return f"M{points[0][0]} {points[0][1]}l{' '.join(map(str, deltas))}z"
+
+
+def _ring_centroid(points):
+    x, y = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+    x1, y1 = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y1 - x1 * y
+    area = cross.sum() / 2
+    if area == 0:
+        return 0.0, points.mean(axis=0).tolist()
+    return abs(area), [float((x + x1) @ cross / (6 * area)), float((y + y1) @ cross / (6 * area))]
+
+
+def match_locations(names, location_dict):
+    """Map country names to location ids: an exact (case-insensitive) name
+    first, otherwise the first location, by id, whose name contains the
+    country name or is contained in it."""
+    locations = [(location_id, name.lower()) for location_id, name in sorted(location_dict.items()) if isinstance(name, str) and name]
+    exact = {}
+    for location_id, name in locations:
+        exact.setdefault(name, location_id)
+    matches = {}
+    for country_name in names:
+        lower = country_name.lower()
+        matches[country_name] = exact.get(lower, next((location_id for location_id, name in locations if name in lower or lower in name), None))
+    return matches
+
+
+def build_world_map(path, location_dict):
+    with open(path) as f:
+        features = json.load(f)['features']
+    location_ids = match_locations([feature['properties']['name'] for feature in features], location_dict)
+    countries = []
+    for feature in features:
+        geometry = feature['geometry']
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        paths = []
+        largest = (-1.0, None)
+        for polygon in polygons:
+            for i, ring in enumerate(polygon):
+                points = _ring_points(ring)
+                if len(points) < 3:
+                    continue
+                paths.append(_ring_path(points))
+                if i == 0:
+                    area, centroid = _ring_centroid(points)
+                    if area > largest[0]:
+                        largest = (area, centroid)
+        if not paths:
+            continue
+        name = feature['properties']['name']
+        # The centroid is that of the largest part, so archipelagos and
+        # overseas territories do not pull it out to sea.
+        countries.append({'location_id': location_ids[name], 'name': name, 'path': ''.join(paths), 'centroid': [round(c) for c in largest[1]]})
+    return {'projection': 'naturalEarth1', 'scale': SCALE, 'countries': countries}
@@ -15,6 +15,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit as st
 
+from gbd_data import catalog
+
 
 #  CONFIGURATION
 
@@ -25,14 +27,6 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-#DATA_DIR = Path(__file__).parent / "data"
-GBD_PATH = "pages\\GBD.csv"
-LOCATION_PATH = "pages\\locations_with_codes.csv"
-COUNTRY_CLS_BY_INCOME_PATH ="pages\\country_classification_by_income.xlsx"
-#CAUSE_MAPPING_PATH = DATA_DIR /"cause_mapping.csv"
-CAUSE_MAPPING_PATH ="pages\\cause_mapping.csv"
-COUNTRY_CLS_BY_INCOME_PATH_SHEET_NAME = "Country Analytical History"
-
 # colour palette
 COLOR_MAP = {
     "H": "#1f77b4",
@@ -114,32 +108,17 @@ LEVEL_CAUSE_IDS = {
 
 
 def _load_raw_gbd() -> pd.DataFrame:
-    """Read and lightly filter the raw GBD CSV."""
-    gbd_dtypes = {
-        "location_id": "int16",
-        "sex_id": "int8",
-        "cause_id": "int16",
-        "metric_id": "int8",
-        "year": "int16",
-        "val": "float32",
-        "metric_name": "category",
-    }
-    use_cols = [
-        "location_id",
-        "sex_id",
-        "cause_id",
-        "metric_id",
-        "year",
-        "val",
-        "metric_name",
-    ]
-    
-    df = pd.read_csv(GBD_PATH, usecols=use_cols, dtype=gbd_dtypes)
-    # keep only mortality rates (metric_id = 3) for both sexes (sex_id = 3)
+    """Mortality rates for both sexes (sex_id = 3) from 1987 on."""
+    df = catalog.query(
+        "gbd",
+        columns=("location_id", "cause_id", "year", "val"),
+        metric="Rate",
+        sex_ids=(3,),
+        years=(1987, None),
+    )
     exclude_ids = [149, 320, 374, 413]
     df = (
-        df[(df.metric_id == 3) & (df.sex_id == 3) & (df.year >= 1987)]
-        .loc[~df.location_id.isin(exclude_ids)]
+        df.loc[~df.location_id.isin(exclude_ids)]
         .rename(columns={"val": "rate"})[["location_id", "cause_id", "year", "rate"]]
     )
     return df
@@ -147,22 +126,13 @@ def _load_raw_gbd() -> pd.DataFrame:
 
 def _load_income_lookup() -> pd.DataFrame:
     """Return a tidy mapping (location_id, year) → income_group."""
-    df_loc = pd.read_csv(
-        LOCATION_PATH,
-        usecols=["location_id", "country_code"],
-        dtype={"location_id": "int16", "country_code": "string"},
-    ).rename(columns={"country_code": "iso3"})
-
-    df_wide = (
-        pd.read_excel(
-            COUNTRY_CLS_BY_INCOME_PATH,
-            sheet_name=COUNTRY_CLS_BY_INCOME_PATH_SHEET_NAME,
-            header=5,
-            dtype=str,
-        )
-        .drop(index=range(0, 5))
-        .reset_index(drop=True)
+    df_loc = (
+        catalog.load("location_codes")
+        .astype({"country_code": "string"})
+        .rename(columns={"country_code": "iso3"})
     )
+
+    df_wide = catalog.load("income_classification").drop(index=range(0, 5)).reset_index(drop=True)
     df_wide = df_wide.rename(columns={df_wide.columns[0]: "iso3", df_wide.columns[1]: "country_name"})
 
     year_cols = [c for c in df_wide.columns if (isinstance(c, int) or (isinstance(c, str) and c.isdigit()))]
@@ -194,7 +164,7 @@ def load_prepared_frames():
     )
 
     # Cause names
-    df_causes = pd.read_csv(CAUSE_MAPPING_PATH, usecols=["cause_id", "cause_name"], dtype={"cause_id": "int16", "cause_name": "string"})
+    df_causes = catalog.load("cause_mapping").astype({"cause_name": "string"})
 
     # Global (all countries) mean
     df_global = (
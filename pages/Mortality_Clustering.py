@@ -10,6 +10,8 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 from sklearn.cluster import AgglomerativeClustering
 
+from gbd_data import catalog, sql
+
 st.set_page_config(
     page_title="Mortality Clustering page",  
     page_icon="🌍",  
@@ -59,16 +61,17 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-@st.cache_data
-def load_data(file):
-    import os
-    print("----")
-    print(os.getcwd())
-    print(file)
-    data = pd.read_parquet(file)
-    cause_map = pd.read_csv("pages\\cause_mapping.csv")
-    location_map = pd.read_csv("pages\\location_mapping.csv")
-    return data, cause_map, location_map
+# Mean value per location and cause-year for the selected causes, years and sex
+CAUSE_YEAR_SQL = """
+SELECT d.location_id,
+       c.cause_name || '_' || CAST(d.year AS VARCHAR) AS cause_year,
+       avg(d.val) AS val
+FROM deaths d JOIN causes c ON d.cause_id = c.cause_id
+WHERE list_contains($causes, c.cause_name)
+  AND d.year BETWEEN $year_from AND $year_to
+  AND d.sex_id = $sex_id
+GROUP BY ALL
+"""
 
 st.title("Mortality Analysis using Clustering")
 
@@ -84,11 +87,10 @@ data_option = st.radio(
 
 st.session_state.use_infant = (data_option == "Infant Mortality Data")
 
-file_path = "pages\\infant_mortality_data.parquet" if st.session_state.use_infant else "pages\\filtered_data.parquet"
-data, cause_map, location_map = load_data(file_path)
-
-data = data.merge(cause_map, on="cause_id", how="left")
-data = data.merge(location_map, on="location_id", how="left")
+dataset = "infant_mortality" if st.session_state.use_infant else "filtered_data"
+data = catalog.load_named(dataset)
+cause_map = catalog.load("cause_mapping")
+location_map = catalog.load("location_mapping")
 
 data_pd = data
 cause_map_pd = cause_map
@@ -118,20 +120,20 @@ if st.button("OK") and selected_causes:
     st.session_state.selected_causes = selected_causes
     st.session_state.year_range = (year_from, year_to)
 
-    filtered = data_pd[ (data_pd["cause_name"].isin(selected_causes)) & (data_pd["year"].between(year_from, year_to)) ]
-
-    if gender_option != "Both":
-        gender_map = {"Male": 1, "Female": 2}
-        filtered = filtered[filtered["sex_id"] == gender_map[gender_option]]
+    gender_map = {"Both": 3, "Male": 1, "Female": 2}
+    params = {"causes": list(selected_causes), "year_from": int(year_from), "year_to": int(year_to), "sex_id": gender_map[gender_option]}
+    cause_years = sql.query(CAUSE_YEAR_SQL, params, deaths=dataset, causes="cause_mapping")
+    if cause_years is not None:
+        pivot = cause_years.pivot(index="location_id", columns="cause_year", values="val").astype("float64").fillna(0)
     else:
-        filtered = filtered[filtered["sex_id"] == 3]
+        filtered = data_pd[ (data_pd["cause_name"].isin(selected_causes)) & (data_pd["year"].between(year_from, year_to)) ]
+        filtered = filtered[filtered["sex_id"] == gender_map[gender_option]]
+        filtered["cause_year"] = filtered["cause_name"].astype(str) + "_" + filtered["year"].astype(str)
+        pivot = filtered.pivot_table(index="location_id", columns="cause_year", values="val", aggfunc="mean").fillna(0)
 
-    if filtered.empty:
+    if pivot.empty:
         st.warning("No data available for the selected filters.")
     else:
-        filtered["cause_year"] = filtered["cause_name"] + "_" + filtered["year"].astype(str)
-        pivot = filtered.pivot_table(index="location_id", columns="cause_year", values="val", aggfunc="mean").fillna(0)
-
         scaler = StandardScaler()
         X_scaled = scaler.fit_transform(pivot)
 
@@ -209,7 +211,7 @@ if not st.session_state.pivot.empty:
         if cluster_summary.empty:
             st.write(f"No data available for Cluster {cluster_id} summary.")
         else:
-            grouped = cluster_summary.groupby("cause_name")["val"].agg(['mean', 'median', 'std'])
+            grouped = cluster_summary.groupby("cause_name", observed=True)["val"].agg(['mean', 'median', 'std'])
             grouped["cluster"] = cluster_id
             summary_data.append(grouped.reset_index())
 
@@ -9,21 +9,14 @@ import torch
 import torch.nn as nn
 from plotly.subplots import make_subplots
 
+from gbd_data import catalog
+
 os.environ["STREAMLIT_WATCHER_TYPE"] = "none"
 
 
 # -------------------- PAGE CONFIG --------------------
 st.set_page_config(layout="wide", page_title="Mortality Trend Forecasting")
 
-# -------------------- LOAD DATA --------------------
-@st.cache_data
-def load_data():
-    data = pd.read_parquet("pages\\filtered_data.parquet")
-    location_map = pd.read_csv("pages\\location_mapping.csv")
-    cause_map = pd.read_csv("pages\\cause_mapping.csv")
-    return data, location_map, cause_map
-
-
 # Create lag sequences function
 def create_lag_sequences(values, sequence_length=3):
     sequences, targets = [], []
@@ -88,11 +81,10 @@ def rolling_forecast_lstm(location_id, sex_id, cause_id, df):
     return actuals, [pred_val], years[:len(group_df)-1], predicted_years
 
 
-data, location_map, cause_map = load_data()
-
-# Merge names into the main dataframe
-data = data.merge(location_map, on='location_id', how='left')
-data = data.merge(cause_map, on='cause_id', how='left')
+# -------------------- LOAD DATA --------------------
+data = catalog.load_named("filtered_data")
+location_map = catalog.load("location_mapping")
+cause_map = catalog.load("cause_mapping")
 
 # -------------------- SIDEBAR FILTERS --------------------
 with st.sidebar:
@@ -155,7 +147,7 @@ map_data = data[data['cause_name'] == selected_disease]
 if selected_map_year != "All Years":
     map_data = map_data[map_data['year'] == selected_map_year]
 
-map_grouped = map_data.groupby('location_name', as_index=False)['val'].mean()
+map_grouped = map_data.groupby('location_name', as_index=False, observed=True)['val'].mean()
 
 # Prepare full map coverage
 all_countries = location_map['location_name'].unique()
@@ -226,29 +218,19 @@ with col2:
 #st.set_page_config(layout="wide")
 st.title(" Top 5 Countries by Mortality Rate (2010–2021)")
 
-# --- Load CSVs ---
-@st.cache_data
-def load_data():
-    filtered_data = pd.read_parquet("pages\\filtered_data.parquet")
-    cause_mapping = pd.read_csv("pages\\cause_mapping.csv")
-    location_mapping = pd.read_csv("pages\\location_mapping.csv")
-    return filtered_data, cause_mapping, location_mapping
-
-filtered_data, cause_mapping, location_mapping = load_data()
-
-# --- Merge mapping ---
-df = filtered_data.merge(cause_mapping, on='cause_id').merge(location_mapping, on='location_id')
+# --- Load data ---
+df = catalog.load_named("filtered_data")
 
 # --- Sidebar Filters ---
 st.sidebar.header("Filter Options")
-selected_cause = st.sidebar.selectbox("Select Cause", sorted(df['cause_name'].unique()))
+selected_cause = st.sidebar.selectbox("Select Cause", sorted(df['cause_name'].dropna().unique()))
 selected_sex = st.sidebar.radio("Select Sex", ["Male", "Female", "Both"])
 
 sex_map = {"Male": 1, "Female": 2, "Both": 3}
 sex_val = sex_map[selected_sex]
 
 # --- Filter data ---
-df = df[(df['cause_name'] == selected_cause) & (df['sex_id'] == sex_val)]
+df = df[(df['cause_name'] == selected_cause) & (df['sex_id'] == sex_val) & df['location_name'].notna()]
 
 # --- Validate ---
 years = list(range(2010, 2022))
@@ -276,7 +258,7 @@ df_top["Angle"] = df_top["Index"] * (360 / len(df_top))
 color_sequence = px.colors.qualitative.Set3
 year_color_map = {year: color_sequence[i % len(color_sequence)] for i, year in enumerate(sorted(df_top["year"].unique()))}
 df_top["Color"] = df_top["year"].map(year_color_map)
-df_top["Label"] = df_top["location_name"] + " (" + df_top["year"] + ")"
+df_top["Label"] = df_top["location_name"].astype(str) + " (" + df_top["year"] + ")"
 
 # --- Create initial figure ---
 fig = make_subplots(rows=1, cols=2, subplot_titles=("Radial View", "Bar Chart"),
@@ -412,12 +394,9 @@ st.plotly_chart(fig, use_container_width=True)
 def main():
     st.title("Mortality Trend Forecasting")
 
-    df = pd.read_parquet("pages\\filtered_data.parquet")
-    cause_mapping = pd.read_csv("pages\\cause_mapping.csv")
-    location_mapping = pd.read_csv("pages\\location_mapping.csv")
-
-    df = df.merge(cause_mapping, on='cause_id', how='left')
-    df = df.merge(location_mapping, on='location_id', how='left')
+    df = catalog.load_named("filtered_data")
+    cause_mapping = catalog.load("cause_mapping")
+    location_mapping = catalog.load("location_mapping")
 
     cause_id = st.selectbox("Choose Cause of Death", df['cause_name'].unique())
     location_id = st.selectbox("Choose Country", df['location_name'].unique())
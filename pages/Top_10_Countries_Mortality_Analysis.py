@@ -1,20 +1,35 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
 
+from gbd_data import catalog, sql
+
 
 st.set_page_config(page_title="Mortality Dashboard", layout="wide")
 st.title(" Global Mortality Data Dashboard")
 
-# Loading data 
-@st.cache_data
-def load_data():
-    return pd.read_csv("pages\\data_2.csv")  
+# Top 10 countries (both sexes) for one year and cause, with rates by sex
+TOP10_BY_SEX_SQL = """
+WITH rates AS (
+    SELECT location_name, sex, death_rate FROM death_rates
+    WHERE year = $year AND cause_name = $cause
+), top10 AS (
+    SELECT location_name FROM rates WHERE sex = 'both'
+    ORDER BY death_rate DESC LIMIT 10
+)
+SELECT location_name,
+       coalesce(sum(death_rate) FILTER (WHERE sex = 'both'), 0) AS "both",
+       coalesce(sum(death_rate) FILTER (WHERE sex = 'female'), 0) AS female,
+       coalesce(sum(death_rate) FILTER (WHERE sex = 'male'), 0) AS male
+FROM rates
+WHERE location_name IN (SELECT location_name FROM top10)
+GROUP BY location_name
+ORDER BY "both"
+"""
 
-df_csv = load_data()
-df_csv["sex"] = df_csv["sex"].str.lower()  
+# Loading data 
+df_csv = catalog.load("death_rates_by_sex")
 
-df_parquet = pd.read_parquet('pages\\aggregated_by_year_location.parquet')
+df_parquet = catalog.load("aggregated_by_year_location")
 
 # tabs setup
 tab1, tab2 = st.tabs(["Top 10 countries Male vs Female", "Global Mortality Trends"])
@@ -29,28 +44,37 @@ with tab1:
     with col2:
         selected_cause = st.selectbox("Select Cause", sorted(df_csv['cause_name'].dropna().unique()))
 
-    filtered_df = df_csv[(df_csv['year'] == selected_year) & (df_csv['cause_name'] == selected_cause)]
+    pivot_df = sql.query(
+        TOP10_BY_SEX_SQL,
+        {"year": int(selected_year), "cause": selected_cause},
+        death_rates="death_rates_by_sex",
+    )
+    if pivot_df is not None:
+        pivot_df = pivot_df.set_index("location_name")
+    else:
+        filtered_df = df_csv[(df_csv['year'] == selected_year) & (df_csv['cause_name'] == selected_cause)]
 
-    both_df = filtered_df[filtered_df['sex'] == "both"]
-    top10_countries = both_df.sort_values("death_rate", ascending=False).head(10)["location_name"].tolist()
+        both_df = filtered_df[filtered_df['sex'] == "both"]
+        top10_countries = both_df.sort_values("death_rate", ascending=False).head(10)["location_name"].tolist()
 
-    sex_df = filtered_df[(
-        filtered_df["sex"].isin(["male", "female","both"])) & 
-        (filtered_df["location_name"].isin(top10_countries))
-    ]
+        sex_df = filtered_df[(
+            filtered_df["sex"].isin(["male", "female","both"])) & 
+            (filtered_df["location_name"].isin(top10_countries))
+        ]
 
-    pivot_df = sex_df.pivot_table(
-        index='location_name',
-        columns='sex',
-        values='death_rate',
-        aggfunc='sum'
-    ).reindex(index=top10_countries).fillna(0)
+        pivot_df = sex_df.pivot_table(
+            index='location_name',
+            columns='sex',
+            values='death_rate',
+            aggfunc='sum',
+            observed=True
+        ).reindex(index=top10_countries).fillna(0)
 
-    pivot_df = pivot_df.sort_values(by="both", ascending=True)
-    if 'male' not in pivot_df.columns:
-        pivot_df['male'] = 0
-    if 'female' not in pivot_df.columns:
-        pivot_df['female'] = 0
+        pivot_df = pivot_df.sort_values(by="both", ascending=True)
+        if 'male' not in pivot_df.columns:
+            pivot_df['male'] = 0
+        if 'female' not in pivot_df.columns:
+            pivot_df['female'] = 0
 
     fig = go.Figure()
 
@@ -113,7 +137,7 @@ with tab2:
             (df_parquet['cause_name'] == cause) & 
             (df_parquet['sex'] == sex)
         ]
-        aggregated = filtered.groupby(['year', 'location_name', 'sex'], as_index=False)['val'].sum()
+        aggregated = filtered.groupby(['year', 'location_name', 'sex'], as_index=False, observed=True)['val'].sum()
         fig2 = go.Figure()
         for country in countries:
             country_df = aggregated[aggregated['location_name'] == country]
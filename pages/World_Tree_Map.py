@@ -1,21 +1,8 @@
 import pandas as pd
 
-dataset_path = "./parquet_files/"
-#gbd_path = f"{dataset_path}GBD.parquet"
-gbd_path = f"pages\\GBD.parquet"
-location_mapping = f"pages\\location_mapping.parquet"
-cause_mapping = f"pages\\cause_mapping.parquet"
-# gdp_path = f"{dataset_path}GDP.parquet"
-gdp_path = f"pages\\gdp_processed.parquet"
-hie_path = f"pages\\IHME_GBD_2021_HIERARCHIES_Y2024M05D16.XLSX"
+from gbd_data import catalog
 
-df = pd.read_parquet(gbd_path)
-
-
-
-df_rate = df[df["metric_name"] == "Rate"]
-
-df_rate = df_rate.drop(columns=['metric_name'])
+df_rate = catalog.query("gbd", columns=("cause_id", "location_id", "year", "val"), metric="Rate")
 
 df_rate = df_rate.rename(columns={"val": "mortality_rate"})
 
@@ -25,9 +12,9 @@ df_rate = df_rate.groupby(['cause_id','location_id', 'year'])['mortality_rate'].
 
 
 
-df_cause = pd.read_parquet(cause_mapping)
+df_cause = catalog.load("cause_mapping")
 
-df_loc = pd.read_parquet(location_mapping)
+df_loc = catalog.load("location_mapping")
 
 merged_df = pd.merge(df_loc, df_rate, on='location_id')
 
@@ -35,13 +22,13 @@ merged_df = pd.merge(merged_df, df_cause, on='cause_id')
 
 merged_df.drop(columns=['location_id', 'cause_id'])
 
-df = merged_df.groupby(['location_name', 'cause_name', 'year'])['mortality_rate'].sum().reset_index()
+df = merged_df.groupby(['location_name', 'cause_name', 'year'], observed=True)['mortality_rate'].sum().reset_index()
 
-df_hie = pd.read_excel(hie_path, sheet_name = 'Cause Hierarchy')
+df_hie = catalog.load("cause_hierarchy")
 causes = df_hie[df_hie["Level"] == 3]["Cause Name"].unique()
 df = df[df['cause_name'].isin(causes)]
 
-world_ = df.groupby(['cause_name','year' ])['mortality_rate'].sum().reset_index()
+world_ = df.groupby(['cause_name','year' ], observed=True)['mortality_rate'].sum().reset_index()
 world_['location_name'] = 'World'
 df = pd.concat([df, world_], ignore_index=True)
 
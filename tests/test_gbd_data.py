@@ -0,0 +1,192 @@
+"""
+Tests for the gbd_data store, its SQL layer and the catalog. Run from the
+repository root with:
+    python -m unittest discover -s tests
+"""
+
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gbd_data import catalog, schema, sources, sql, store  # noqa: E402
+
+LOCATIONS = {6: "China", 7: "North Korea", 102: "United States"}
+CAUSES = {298: "HIV/AIDS", 410: "Neoplasms"}
+
+
+def gbd_rows():
+    # Values are exact in float32, so stored and parsed frames compare equal.
+    rows = []
+    for location_id in LOCATIONS:
+        for cause_id in CAUSES:
+            for sex_id in (1, 2):
+                for year in (2000, 2001, 2002):
+                    for metric_name in ("Rate", "Number"):
+                        val = location_id + cause_id / 4 + sex_id / 8 + (year - 2000) * 16
+                        rows.append((location_id, cause_id, sex_id, year, metric_name, val * (1 if metric_name == "Rate" else 1000)))
+    return rows
+
+
+def write_sources(data_dir):
+    pd.DataFrame(gbd_rows(), columns=sources.GBD_COLUMNS).to_csv(os.path.join(data_dir, "GBD.csv"), index=False)
+    pd.DataFrame({"location_id": list(LOCATIONS), "location_name": list(LOCATIONS.values())}).to_csv(os.path.join(data_dir, "location_mapping.csv"), index=False)
+    pd.DataFrame({"cause_id": list(CAUSES), "cause_name": list(CAUSES.values())}).to_csv(os.path.join(data_dir, "cause_mapping.csv"), index=False)
+
+
+def rows(frame):
+    """The rows of ``frame`` as sorted plain tuples, whatever its dtypes."""
+    return sorted(tuple(row) for row in frame.astype(object).itertuples(index=False))
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        self.store_dir = os.path.join(self.data_dir, "store")
+        os.makedirs(self.store_dir)
+        write_sources(self.data_dir)
+        self.version = store.build(self.data_dir, self.store_dir, log=lambda *args: None)
+        self.gbd = schema.apply(pd.read_csv(os.path.join(self.data_dir, "GBD.csv")))
+
+    def expected(self, columns, metric=None, sex_ids=None, years=None, cause_ids=None, location_ids=None):
+        """The plain pandas filter the store and SQL reads must agree with."""
+        frame = self.gbd
+        keep = pd.Series(True, index=frame.index)
+        if metric is not None:
+            keep &= frame["metric_name"] == metric
+        if sex_ids is not None:
+            keep &= frame["sex_id"].isin(sex_ids)
+        if cause_ids is not None:
+            keep &= frame["cause_id"].isin(cause_ids)
+        if location_ids is not None:
+            keep &= frame["location_id"].isin(location_ids)
+        if years is not None:
+            first, last = years
+            if first is not None:
+                keep &= frame["year"] >= first
+            if last is not None:
+                keep &= frame["year"] <= last
+        return rows(frame.loc[keep, list(columns)])
+
+
+class BuildTest(StoreTestCase):
+    def test_manifest(self):
+        manifest = store.read_manifest(self.store_dir)
+        self.assertEqual((manifest["format"], manifest["version"]), (store.STORE_FORMAT, self.version))
+        self.assertEqual(set(manifest["datasets"]), {"gbd", "location_mapping", "cause_mapping"})
+        gbd = manifest["datasets"]["gbd"]
+        self.assertEqual((gbd["source"], gbd["rows"], gbd["partition"]), ("GBD.csv", len(self.gbd), "int16"))
+        self.assertEqual(sorted(gbd["files"]), [f"gbd/year={year}/part-0.parquet" for year in (2000, 2001, 2002)])
+        version_dir = os.path.join(self.store_dir, self.version)
+        for path, digest in gbd["files"].items():
+            self.assertEqual(store.file_sha256(os.path.join(version_dir, path)), digest)
+
+    def test_unchanged_sources_are_not_rebuilt(self):
+        messages = []
+        self.assertEqual(store.build(self.data_dir, self.store_dir, log=messages.append), self.version)
+        self.assertEqual(messages, [f"Store {self.version} is up to date"])
+
+    def test_changed_source_is_not_read_from_the_store(self):
+        with open(os.path.join(self.data_dir, "GBD.csv"), "a") as f:
+            f.write("6,298,1,2003,Rate,1.0\n")
+        self.assertIsNone(store.locate("gbd", self.store_dir, self.data_dir))
+        self.assertIsNotNone(store.locate("cause_mapping", self.store_dir, self.data_dir))
+        self.assertNotEqual(store.build(self.data_dir, self.store_dir, log=lambda *args: None), self.version)
+
+    def test_manifest_of_another_format_is_ignored(self):
+        path = os.path.join(self.store_dir, store.MANIFEST_NAME)
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest["format"] = store.STORE_FORMAT - 1
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+        self.assertIsNone(store.read("gbd", directory=self.store_dir, data_dir=self.data_dir))
+
+
+class ReadTest(StoreTestCase):
+    COLUMNS = ("location_id", "cause_id", "sex_id", "year", "val")
+
+    def read(self, **filters):
+        return store.read("gbd", self.COLUMNS, store.row_filters(**filters), self.store_dir, self.data_dir)
+
+    def test_filters_match_pandas(self):
+        for filters in ({}, {"metric": "Rate"}, {"metric": "Number", "sex_ids": [2], "years": (2001, 2002)},
+                        {"cause_ids": [410], "location_ids": [6, 102], "years": (None, 2000)}, {"years": (2001, None)}):
+            with self.subTest(**filters):
+                self.assertEqual(rows(self.read(**filters)), self.expected(self.COLUMNS, **filters))
+
+    def test_types(self):
+        frame = self.read(metric="Rate")
+        self.assertEqual([str(frame[c].dtype) for c in self.COLUMNS], ["int16", "int16", "int8", "int16", "float32"])
+        self.assertEqual(str(store.read("gbd", directory=self.store_dir, data_dir=self.data_dir)["metric_name"].dtype), "category")
+
+
+class CatalogQueryTest(StoreTestCase):
+    COLUMNS = ("location_id", "year", "val")
+    FILTERS = {"metric": "Rate", "sex_ids": (1,), "years": (2001, 2002), "cause_ids": (298,)}
+
+    def setUp(self):
+        super().setUp()
+        for cached in (catalog.query, catalog.load):
+            cached.clear()
+            self.addCleanup(cached.clear)
+
+    def test_from_store(self):
+        with mock.patch.object(store, "read", functools.partial(store.read, directory=self.store_dir, data_dir=self.data_dir)):
+            frame = catalog.query("gbd", self.COLUMNS, **self.FILTERS)
+        self.assertEqual(rows(frame), self.expected(self.COLUMNS, **self.FILTERS))
+
+    def test_from_raw_file(self):
+        with mock.patch.object(store, "read", lambda *args, **kwargs: None), \
+                mock.patch.object(sources, "read_source", functools.partial(sources.read_source, data_dir=self.data_dir)):
+            frame = catalog.query("gbd", self.COLUMNS, **self.FILTERS)
+        self.assertEqual(rows(frame), self.expected(self.COLUMNS, **self.FILTERS))
+        self.assertFalse(frame["val"].to_numpy().flags.writeable)
+
+
+@unittest.skipUnless(sql.available(), "duckdb is not installed")
+class SqlQueryTest(StoreTestCase):
+    TEXT = """
+        SELECT g.location_id, g.year, g.val, c.cause_name
+        FROM gbd g JOIN causes c USING (cause_id)
+        WHERE g.metric_name = $metric AND g.sex_id = $sex_id AND g.year BETWEEN $first AND $last
+    """
+    PARAMS = {"metric": "Rate", "sex_id": 2, "first": 2000, "last": 2001}
+
+    def expected_joined(self):
+        frame = self.gbd.merge(pd.DataFrame({"cause_id": list(CAUSES), "cause_name": list(CAUSES.values())}), on="cause_id")
+        keep = (frame["metric_name"] == "Rate") & (frame["sex_id"] == 2) & frame["year"].between(2000, 2001)
+        return rows(frame.loc[keep, ["location_id", "year", "val", "cause_name"]])
+
+    def test_over_store(self):
+        with mock.patch.object(store, "locate", functools.partial(store.locate, directory=self.store_dir, data_dir=self.data_dir)):
+            frame = sql.query(self.TEXT, self.PARAMS, gbd="gbd", causes="cause_mapping")
+        self.assertEqual(rows(frame), self.expected_joined())
+
+    def test_over_frames(self):
+        causes = sources.read_source("cause_mapping", self.data_dir)
+        self.assertEqual(rows(sql.query(self.TEXT, self.PARAMS, gbd=self.gbd, causes=causes)), self.expected_joined())
+
+    def test_dataset_missing_from_store(self):
+        with mock.patch.object(store, "locate", lambda *args, **kwargs: None):
+            self.assertIsNone(sql.query(self.TEXT, self.PARAMS, gbd="gbd", causes="cause_mapping"))
+
+
+class SqlFallbackTest(unittest.TestCase):
+    def test_without_duckdb(self):
+        with mock.patch.object(sql, "duckdb", None):
+            self.assertFalse(sql.available())
+            self.assertIsNone(sql.query("SELECT 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()